@@ -0,0 +1,14 @@
+from article_store import ArticleStore
+import os
+
+# compact the append only article and portfolio stores, run separately from the daily
+# fetch and index scripts, e.g. once a week
+for filename in ['newsapi_articles.jsonl', 'stock_portfolio.jsonl']:
+    if not os.path.exists(filename):
+        print('Skipping {}, no store yet'.format(filename))
+        continue
+    store = ArticleStore(filename)
+    size_before = os.path.getsize(filename)
+    store.compact()
+    print('Compacted {}: {} records, {} -> {} bytes'.format(
+        filename, len(store), size_before, os.path.getsize(filename)))
@@ -0,0 +1,35 @@
+import json
+import os
+from term_doc_matrix import buildTermDocMatrix
+from binary_index import writeBinaryIndex
+from article_store import openStore
+
+# convert the json files written by the index scripts into memory mappable index folders
+# run from the folder holding the json files, a collection with missing files is skipped
+collections = {
+    'cranfield_index': ['cranfield_document_tf_idf.json', 'cranfield_inverted_index.json',
+                        'cranfield_pointer_index.json'],
+    'article_index': ['article_tf_idf.json', 'inverted_index.json', 'pointer_index.json']
+}
+
+for dirname, filenames in collections.items():
+    if not all(os.path.exists(filename) for filename in filenames):
+        print('Skipping {}, missing one of {}'.format(dirname, ', '.join(filenames)))
+        continue
+
+    with open(filenames[0], 'r') as json_file:
+        document_tf_idf_dict = json.load(json_file)
+    with open(filenames[1], 'r') as json_file:
+        inverted_index = json.load(json_file)
+    with open(filenames[2], 'r') as json_file:
+        pointer_index = json.load(json_file)
+
+    # article publish dates kept by 'News API' become the day number column of the index
+    doc_dates = None
+    if dirname == 'article_index' and os.path.exists('article_dates.jsonl'):
+        doc_dates = dict(openStore('article_dates.jsonl').stream())
+
+    term_doc_matrix = buildTermDocMatrix(document_tf_idf_dict)
+    writeBinaryIndex(dirname, term_doc_matrix, inverted_index, pointer_index, doc_dates)
+    print('Wrote {}: {} documents, {} terms, {} postings'.format(
+        dirname, term_doc_matrix.shape[0], term_doc_matrix.shape[1], term_doc_matrix.matrix.nnz))
@@ -1,63 +1,133 @@
 import json
 import os
-import copy
-import pandas as pd
 import numpy as np
-from numpy.linalg import norm
+from scipy import sparse
+from scipy.sparse.linalg import norm as sparse_norm
+from term_doc_matrix import buildTermDocMatrix, buildQueryMatrix
+from scoring import cosineScores, topKDocuments, thresholdDocuments
+from cooccurrence import buildCooccurIndex, expandTermsFromIndex, loadCooccurIndex
+from binary_index import loadBinaryIndex
+from topk_retrieval import buildImpactPostings, maxScoreTopK
+from local_analysis import localExpandAndQuery
+from query_cache import QueryCache, cachedScores
+from portfolio_queries import portfolioResults
+from instrumentation import instruments
+from lsi import loadLatentIndex, latentScores
+from bm25 import bm25FromBinaryIndex, bm25Scores
+from evaluation import qrelsMatrix, scoreMatrix, setCounts, ratio, evaluate, bestThreshold
 
 # set to false if want to see document level specific results
 hide_detail = True
 
+# score vectors of queries already run, see cachedQueryResults
+query_cache = QueryCache()
+
+# stage timers and counters are off unless 'instrumentation.json' next to this file turns them on,
+# see instrumentation.py for the settings and exportInstrumentation to write the report
+instruments.configure(os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instrumentation.json'))
+
 
 def loadFiles(test=False):
     # load files depending on using test dataset or own dataset
     os.chdir(os.path.abspath(os.path.dirname(__file__)))
     if test:
         return ['cranfield_document_tf_idf.json', 'cranfield_query_terms.json',
-                'cranfield_query_rel.json']
+                'cranfield_query_rel.json', 'cranfield_cooccur_index.json']
     else:
-        return ['article_tf_idf.json', 'query_terms.json']
+        return ['article_tf_idf.json', 'query_terms.json', 'cooccur_index.json']
 
 
-def getTermDocDF(document_tf_idf_dict, indices=None):
-    # create a pandas dataframe of a document by term table
-    if indices is None:
-        indices = []
-    rows_list = []
+@instruments.timed()
+def loadIndex(test=False):
+    # memory map the binary index written by the index scripts or Convert Index.py,
+    # much faster than loading the tf*idf json, use .matrix in place of getTermDocMatrix
+    os.chdir(os.path.abspath(os.path.dirname(__file__)))
+    if test:
+        return loadBinaryIndex('cranfield_index')
+    else:
+        return loadBinaryIndex('article_index')
+
+
+def loadLatent(test=False):
+    # memory map the latent (lsi) document vectors written by the index scripts
+    os.chdir(os.path.abspath(os.path.dirname(__file__)))
+    if test:
+        return loadLatentIndex('cranfield_lsi')
+    else:
+        return loadLatentIndex('article_lsi')
+
+
+@instruments.timed()
+def latentQueryResults(query_term_dict, latent_index):
+    # same dictionary as batchQueryResults, scored against the low rank document vectors
+    # instead of the full vocabulary, related terms are matched without expanding the query
+    scores = latentScores(latent_index, query_term_dict)
+    return {name: list(scores[i]) for i, name in enumerate(query_term_dict)}
+
+
+@instruments.timed()
+def getBM25(index, k1=1.2, b=0.75):
+    # bm25 scorer from the term counts and document lengths stored in a binary index from loadIndex
+    return bm25FromBinaryIndex(index, k1, b)
+
 
-    for url, terms in document_tf_idf_dict.items():
-        df_row = {'Url': url}
-        for term, val in terms.items():
-            df_row.update({term: val})
-        rows_list.append(df_row)
+@instruments.timed()
+def bm25QueryResults(query_term_dict, bm25_scorer):
+    # same dictionary as batchQueryResults ranked by bm25 instead of cosine similarity,
+    # scores aren't bounded by 1 so the cosine thresholds don't carry over, use top n or sweepThresholds
+    scores = bm25Scores(bm25_scorer, query_term_dict)
+    return {name: list(scores[i]) for i, name in enumerate(query_term_dict)}
 
-    term_doc_df = pd.DataFrame(rows_list)
-    term_doc_df.fillna(0, inplace=True)
-    term_doc_df.set_index('Url', inplace=True)
-    if indices:
-        term_doc_df = term_doc_df.iloc[indices, :]
-    return term_doc_df
 
+@instruments.timed()
+def getTermDocMatrix(document_tf_idf_dict, indices=None):
+    # create a sparse document by term matrix, never builds the dense table
+    return buildTermDocMatrix(document_tf_idf_dict, indices)
 
+
+def getTermDocDF(document_tf_idf_dict, indices=None):
+    # kept so older notebook cells still run, now returns the sparse term document matrix
+    return getTermDocMatrix(document_tf_idf_dict, indices)
+
+
+@instruments.timed()
 def getTermCoOccurMatrix(relevant_doc_df):
     # build a term co-occurrence matrix to help with query expansion
-    term_array = relevant_doc_df.to_numpy()
-    term_array_trans = term_array.transpose()
-    term_cooccur = np.dot(term_array_trans, term_array) / (norm(term_array) * norm(term_array_trans))
-    return term_cooccur
+    term_array = relevant_doc_df.matrix
+    term_array_trans = term_array.transpose().tocsr()
+    term_cooccur = (term_array_trans @ term_array) / (sparse_norm(term_array) * sparse_norm(term_array_trans))
+    return sparse.csr_matrix(term_cooccur)
 
 
+@instruments.timed()
+def getCooccurIndex(relevant_doc_df, k=10, query_terms=None):
+    # build only the top k related terms per term instead of the full co-occurrence matrix
+    # give the query term dictionary to only compute the rows for the query vocabulary
+    terms = None
+    if query_terms is not None:
+        terms = set(term for term_list in query_terms.values() for term in term_list)
+    return buildCooccurIndex(relevant_doc_df, k, terms)
+
+
+@instruments.timed()
 def expandQuery(term_cooccur, relevant_doc_df, query_terms, n=4):
     # get expanded queries for all query terms, use n = 3 to start
     # set n = n + 1 to account for own term matching
-    expanded_query_term_dict = copy.deepcopy(query_terms)
+    # term_cooccur can be a co-occurrence matrix or a neighbour index from getCooccurIndex
+    # the term lists are copied, the terms themselves are strings so no deep copy is needed
+    expanded_query_term_dict = {name: list(term_list) for name, term_list in query_terms.items()}
     for name, term_list in query_terms.items():
+        if isinstance(term_cooccur, dict):
+            expanded_query_term_dict[name].extend(expandTermsFromIndex(term_cooccur, term_list, n))
+            continue
         for term in term_list:
-            if term in relevant_doc_df.columns:
-                term_loc = relevant_doc_df.columns.get_loc(term)
+            if term in relevant_doc_df.term_index:
+                term_loc = relevant_doc_df.term_index[term]
                 cooccur_vals = term_cooccur[term_loc]
+                if sparse.issparse(cooccur_vals):
+                    cooccur_vals = cooccur_vals.toarray().ravel()
                 indices = np.argpartition(cooccur_vals, -n)[-n:]
-                extra_terms = list(relevant_doc_df.columns[indices])
+                extra_terms = [relevant_doc_df.terms[i] for i in indices]
                 expanded_query_term_dict[name].extend(extra_terms)
 
     # get rid of duplicate terms
@@ -66,53 +136,83 @@ def expandQuery(term_cooccur, relevant_doc_df, query_terms, n=4):
     return expanded_query_term_dict
 
 
+@instruments.timed()
 def queryDocuments(query_term_dict, relevant_doc_df):
-    # querying documents
-    rows_list = []
-
-    for name, query_terms in query_term_dict.items():
-        df_row = {'Name': name}
-        for term in query_terms:
-            if term in relevant_doc_df.columns:
-                df_row.update({term: 1})
-        rows_list.append(df_row)
-
-    query_df = pd.DataFrame(rows_list)
-    query_df.fillna(0, inplace=True)
-    query_df.set_index('Name', inplace=True)
-
-    term_doc_queries_df = relevant_doc_df.append(query_df)
-    term_doc_queries_df.fillna(0, inplace=True)
-    term_doc_queries_array = term_doc_queries_df.to_numpy()
+    # querying documents, stack the query rows under the document rows
+    query_matrix = buildQueryMatrix(query_term_dict, relevant_doc_df)
+    term_doc_queries_array = sparse.vstack([relevant_doc_df.matrix, query_matrix], format='csr')
     return term_doc_queries_array
 
 
+@instruments.timed()
 def queryResults(query_term_dict, term_doc_queries_array):
     # make a dictionary of the results
-    query_results = {}
+    # the query rows are at the bottom of the array, as stacked by queryDocuments
+    term_doc_queries_array = sparse.csr_matrix(term_doc_queries_array)
+    term_doc_queries_array.data = np.nan_to_num(term_doc_queries_array.data)
+    num_docs = term_doc_queries_array.shape[0] - len(query_term_dict)
+
+    # get cosine similarity between all queries and documents in one batch
+    scores = cosineScores(term_doc_queries_array[num_docs:], term_doc_queries_array[:num_docs])
+    return {name: list(scores[i]) for i, name in enumerate(query_term_dict)}
+
+
+@instruments.timed()
+def scoreQueries(query_term_dict, relevant_doc_df):
+    # cosine score every query against every document, rows follow the query dictionary order
+    # uses the document norms stored on the matrix so repeat calls don't recompute them
+    query_matrix = buildQueryMatrix(query_term_dict, relevant_doc_df)
+    return cosineScores(query_matrix, relevant_doc_df.matrix, relevant_doc_df.doc_norms)
+
+
+def batchQueryResults(query_term_dict, relevant_doc_df):
+    # same dictionary as queryResults without stacking the queries under the documents
+    scores = scoreQueries(query_term_dict, relevant_doc_df)
+    return {name: list(scores[i]) for i, name in enumerate(query_term_dict)}
 
-    # get cosine similarity between query and documents
-    term_doc_queries_array = np.nan_to_num(term_doc_queries_array)
-    for i, name in enumerate(query_term_dict):
-        query_results[name] = []
-        query_loc = len(term_doc_queries_array) - len(query_term_dict) + i
-        for row in term_doc_queries_array[:-len(query_term_dict), :]:
-            query_results[name].append(
-                np.dot(term_doc_queries_array[query_loc], row) / (norm(term_doc_queries_array[query_loc]) * norm(row)))
-    return query_results
+
+@instruments.timed()
+def rankedQueryResults(query_term_dict, relevant_doc_df, k=None, threshold=None):
+    # get the document ids for each query best first, keep the top k and / or those over the threshold
+    scores = scoreQueries(query_term_dict, relevant_doc_df)
+    num_docs = scores.shape[1]
+    ranked = topKDocuments(scores, num_docs if k is None else k)
+    if threshold is not None:
+        passing = thresholdDocuments(scores, threshold)
+        ranked = [row[np.isin(row, keep)] for row, keep in zip(ranked, passing)]
+    return {name: [relevant_doc_df.doc_ids[i] for i in ranked[q]] for q, name in enumerate(query_term_dict)}
 
 
 def expandToFullArray(local_query_results, term_doc_df, indices):
     # use to expand the local query results to the entire term array
-    full_array_query_results = []
-    c = 0
-    for i in range(len(term_doc_df)):
-        if i in indices:
-            full_array_query_results.append(local_query_results[c])
-            c += 1
-        else:
-            full_array_query_results.append(0)
-    return full_array_query_results
+    full_array_query_results = np.zeros(len(term_doc_df))
+    full_array_query_results[np.asarray(indices, dtype=np.int64)] = local_query_results
+    return list(full_array_query_results)
+
+
+@instruments.timed()
+def getLocalQueryResults(relevant_doc_df, query_term_dict, n=4, workers=1):
+    # the whole local analysis loop of the notebook in one batched call, gives the same
+    # dictionary as the combined local query results, see local_analysis.localExpandAndQuery
+    return localExpandAndQuery(relevant_doc_df, query_term_dict, n, workers)
+
+
+@instruments.timed()
+def cachedQueryResults(query_term_dict, relevant_doc_df, mode='global', n=4, term_cooccur=None):
+    # query results through the cache, so repeat queries and threshold sweeps skip expansion and scoring
+    # mode is 'plain' (no expansion), 'global' (expand with term_cooccur, a co-occurrence matrix
+    # or neighbour index) or 'local' (getLocalQueryResults), cached scores are dropped
+    # automatically once the index is rebuilt since the index version is part of every key,
+    # global keys also hold a hash of term_cooccur so another matrix or index isn't mixed up with it
+    def scoreMisses(misses):
+        if mode == 'local':
+            return localExpandAndQuery(relevant_doc_df, misses, n)
+        if mode == 'global':
+            misses = expandQuery(term_cooccur, relevant_doc_df, misses, n)
+        return batchQueryResults(misses, relevant_doc_df)
+
+    source_version = query_cache.sourceVersion(term_cooccur) if mode == 'global' else None
+    return cachedScores(query_cache, relevant_doc_df.version, mode, query_term_dict, n, scoreMisses, source_version)
 
 
 def getRelevantDocuments(local_query_results):
@@ -134,56 +234,63 @@ def outputQueryResultsForTest(expanded_query_results, relevant_doc_df, threshold
         arr = np.nan_to_num(arr)
         indices = np.where(arr > threshold)
         new_arr = arr[indices]
-        rel_docs = relevant_doc_df.iloc[indices]
+        rel_docs = [relevant_doc_df.doc_ids[i] for i in indices[0]]
         if not hide_detail:
             print('\nDocument {} matching documents are: '.format(name))
-        for i, num in enumerate(rel_docs.index.values):
+        for i, num in enumerate(rel_docs):
             if not hide_detail:
                 print('\t{}: cosine sim = {}'.format(num, new_arr[i]))
-        query_results[name] = rel_docs.index.values.tolist()
+        query_results[name] = rel_docs
     return query_results
 
 
 def outputPrecisionResultsForTest(query_top_docs, query_relevance, global_or_local):
-    # get precision results for test using query relevance file
-    sum_tot_tp = 0
-    sum_tot_fn = 0
-    sum_tot_fp = 0
-    for query_num in query_top_docs:
-        sum_query_tp = 0
-        sum_query_fn = 0
-        sum_query_fp = 0
-        for doc_num in query_top_docs[query_num]:
-            # Cranfield docs are not 0 based, add 1 to doc_nums
-            if int(doc_num) + 1 in query_relevance[query_num]:
-                sum_query_tp += 1
-            else:
-                sum_query_fp += 1
-        sum_query_fn += (len(query_relevance[query_num]) - sum_query_tp)
-        query_precision = 0
-        query_recall = 0
-        if sum_query_tp + sum_query_fp:
-            query_precision = sum_query_tp / (sum_query_tp + sum_query_fp)
-        if sum_query_tp + sum_query_fn:
-            query_recall = sum_query_tp / (sum_query_tp + sum_query_fn)
-        if not hide_detail:
+    # get precision results for test using query relevance file, counted for every query at once
+    # Cranfield docs are not 0 based, add 1 to doc_nums
+    query_names = list(query_top_docs)
+    retrieved_docs = {name: [int(doc_num) + 1 for doc_num in doc_nums] for name, doc_nums in query_top_docs.items()}
+    num_docs = 1 + max([0] + [doc_num for doc_nums in retrieved_docs.values() for doc_num in doc_nums] +
+                       [int(doc_num) for name in query_names for doc_num in query_relevance[name]])
+    retrieved = qrelsMatrix(retrieved_docs, query_names, range(num_docs), 0)
+    qrels = qrelsMatrix(query_relevance, query_names, range(num_docs), 0)
+    tp, fp, fn = setCounts(retrieved, qrels)
+
+    if not hide_detail:
+        for query_num, query_precision, query_recall in zip(query_names, ratio(tp, tp + fp), ratio(tp, tp + fn)):
             print(
                 '\nPrecision score for query number {} is {} in {}'.format(query_num, query_precision, global_or_local))
             print('\nRecall score for query number {} is {} in {}'.format(query_num, query_recall, global_or_local))
-        sum_tot_tp += sum_query_tp
-        sum_tot_fp += sum_query_fp
-        sum_tot_fn += sum_query_fn
-
-    overall_precision = 0
-    overall_recall = 0
-    if sum_tot_tp + sum_tot_fp:
-        overall_precision = sum_tot_tp / (sum_tot_tp + sum_tot_fp)
-    if sum_tot_tp + sum_tot_fn:
-        overall_recall = sum_tot_tp / (sum_tot_tp + sum_tot_fn)
+
+    overall_precision = float(ratio(tp.sum(), tp.sum() + fp.sum()))
+    overall_recall = float(ratio(tp.sum(), tp.sum() + fn.sum()))
     print('\nPrecision score overall for {} is {}'.format(global_or_local, overall_precision))
     print('\nRecall score overall for {} is {}'.format(global_or_local, overall_recall))
 
 
+def evaluateQueryResults(query_results, query_relevance, relevant_doc_df, k_values=(5, 10), threshold=None):
+    # MAP, nDCG, P@k and R@k (and precision / recall over threshold) of {query: scores} results
+    # for every query with relevance judgements at once, queries with no results score 0
+    query_names = list(query_relevance)
+    scores = scoreMatrix(query_results, query_names, len(relevant_doc_df))
+    qrels = qrelsMatrix(query_relevance, query_names, relevant_doc_df.doc_ids)
+    results = evaluate(scores, qrels, k_values, threshold)
+    for measure, value in results.items():
+        print('{}: {}'.format(measure, value))
+    return results
+
+
+def sweepThresholds(query_results, query_relevance, relevant_doc_df, thresholds=None, measure='f1'):
+    # overall precision, recall and f1 of {query: scores} results at every threshold in one call,
+    # gives the threshold with the best measure, thresholds default to every 0.01 from 0 to 1
+    query_names = list(query_relevance)
+    scores = scoreMatrix(query_results, query_names, len(relevant_doc_df))
+    qrels = qrelsMatrix(query_relevance, query_names, relevant_doc_df.doc_ids)
+    threshold, best = bestThreshold(scores, qrels, thresholds, measure)
+    print('Best threshold by {} is {}: precision {}, recall {}, f1 {}'.format(
+        measure, threshold, best['precision'], best['recall'], best['f1']))
+    return threshold
+
+
 def outputQueryResults(expanded_query_results, relevant_doc_df):
     # give results as top n articles for each company
     # start with n = 3
@@ -196,8 +303,7 @@ def outputQueryResults(expanded_query_results, relevant_doc_df):
             expanded_query_top_n[name] = 'No Results'
             continue
         indices = np.argpartition(arr, -n)[-n:]
-        top_articles = relevant_doc_df.iloc[indices]
-        expanded_query_top_n[name] = top_articles.index.values.tolist()
+        expanded_query_top_n[name] = [relevant_doc_df.doc_ids[i] for i in indices]
 
     for name in expanded_query_top_n:
         print('\nCompany {} top {} articles are: '.format(name, n))
@@ -234,3 +340,79 @@ def outputPrecisionResults(expanded_query_top_n, global_or_local):
 
     overall_score = sum_tot / sum(len(v) for v in relevance_results.values())
     print('\nPrecision score overall for {} is {}'.format(global_or_local, overall_score))
+
+
+@instruments.timed()
+def getImpactPostings(relevant_doc_df):
+    # postings with normalized weights and per term upper bounds for outputTopKQueryResults
+    return buildImpactPostings(relevant_doc_df)
+
+
+@instruments.timed()
+def outputTopKQueryResults(query_term_dict, impact_postings, relevant_doc_df, n=3):
+    # same output as outputQueryResults, but only walks the postings of the query terms
+    # and skips documents that can't make the top n instead of scoring every document
+    expanded_query_top_n = {}
+
+    for name, query_terms in query_term_dict.items():
+        top = maxScoreTopK(impact_postings, query_terms, n)
+        if not top:
+            expanded_query_top_n[name] = 'No Results'
+            continue
+        expanded_query_top_n[name] = [relevant_doc_df.doc_ids[row] for row, _ in top]
+
+    for name in expanded_query_top_n:
+        print('\nCompany {} top {} articles are: '.format(name, n))
+        if expanded_query_top_n[name] == 'No Results':
+            print('\tNo articles relating to {}'.format(name))
+            continue
+        for i, article in enumerate(expanded_query_top_n[name]):
+            print('\t{}: {}'.format(i + 1, article))
+    return expanded_query_top_n
+
+
+@instruments.timed()
+def outputPortfolioResults(index, portfolio_dict, k=3, days_before=3, days_after=1, cooccur_index=None, n=4,
+                           include_undated=True):
+    # top k articles of each day's movers, only articles published from days_before days before
+    # the day to days_after days after it, every company is scored once over all the days
+    # index is a binary index from loadIndex written with article dates, pass a co-occurrence
+    # neighbour index to expand the company names first with the n closest terms of each term
+    # articles with no known publish date are ranked on every day unless include_undated is False
+    if not hasattr(index, 'doc_days'):
+        raise ValueError('{} has no article dates, rebuild it with Inverted Index Creation.py'.format(index.dirname))
+    day_results = portfolioResults(index.matrix, index.doc_days, portfolio_dict, k, days_before, days_after,
+                                   cooccur_index, n, include_undated)
+    for day, company_results in day_results.items():
+        print('\n{}'.format(day))
+        for name, articles in company_results.items():
+            print('\tCompany {} top {} articles are: '.format(name, k))
+            if not articles:
+                print('\t\tNo articles relating to {}'.format(name))
+            for i, article in enumerate(articles):
+                print('\t\t{}: {}'.format(i + 1, article))
+    return day_results
+
+
+def exportInstrumentation(json_file=None, prometheus_file=None):
+    # write the stage timers, counters and memory high water marks collected so far
+    # to the json / prometheus text files given or set in instrumentation.json
+    instruments.export(json_file, prometheus_file)
+    return instruments.report()
+
+
+def profileQuery(query_terms, relevant_doc_df, mode='global', n=4, term_cooccur=None, limit=25):
+    # run a single query under cProfile without the cache and print where the time went,
+    # query_terms is a list of stemmed terms, the raw stats go to profile_file if configured
+    query_term_dict = {'query': list(query_terms)}
+
+    def runQuery():
+        if mode == 'local':
+            return localExpandAndQuery(relevant_doc_df, query_term_dict, n)
+        if mode == 'global':
+            return batchQueryResults(expandQuery(term_cooccur, relevant_doc_df, query_term_dict, n), relevant_doc_df)
+        return batchQueryResults(query_term_dict, relevant_doc_df)
+
+    result, stats_text = instruments.profile(runQuery, limit=limit)
+    print(stats_text)
+    return result
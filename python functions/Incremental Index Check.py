@@ -0,0 +1,74 @@
+import json
+import os
+import runpy
+import tempfile
+from article_store import openStore
+from synthetic_corpus import generateDocuments
+
+# check that the incremental build of 'Inverted Index Creation' ends up with the same index as a
+# full build of the same articles, after new articles are added and after compacting the store
+# drops articles that were already indexed, each step runs the real script in a scratch folder
+
+# number of articles in the first build, added afterwards, and dropped by compaction
+first_docs = 300
+added_docs = 100
+dropped_docs = 50
+
+script = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'Inverted Index Creation.py')
+articles = [('http://site{}.com/a/{}'.format(num % 7, num), text)
+            for num, text in generateDocuments(first_docs + added_docs, vocab_size=5000, num_topics=20)]
+dropped_urls = set(url for url, _ in articles[first_docs - dropped_docs:first_docs])
+
+
+def runIndexScript(dirname):
+    # run the index script in a folder, gives its inverted index keyed on term (ids can differ
+    # between builds) and its tf*idf dictionary
+    cwd = os.getcwd()
+    os.chdir(dirname)
+    try:
+        runpy.run_path(script, run_name='__main__')
+        with open('inverted_index.json', 'r') as json_file:
+            inverted_index = json.load(json_file)
+        with open('pointer_index.json', 'r') as json_file:
+            pointer_index = json.load(json_file)
+        with open('article_tf_idf.json', 'r') as json_file:
+            article_tf_idf_dict = json.load(json_file)
+    finally:
+        os.chdir(cwd)
+    postings = {term: (entry['freq'], pointer_index[str(entry['id'])]) for term, entry in inverted_index.items()}
+    return postings, article_tf_idf_dict
+
+
+def fullBuild(records):
+    # index a new store holding only the given articles from scratch
+    with tempfile.TemporaryDirectory() as dirname:
+        openStore(os.path.join(dirname, 'newsapi_articles.jsonl')).append(dict(records))
+        return runIndexScript(dirname)
+
+
+def sameIndex(incremental_result, full_result):
+    # same postings for every term and the same tf*idf values for every article
+    (incremental_postings, incremental_tf_idf), (full_postings, full_tf_idf) = incremental_result, full_result
+    return incremental_postings == full_postings and incremental_tf_idf.keys() == full_tf_idf.keys() and all(
+        incremental_tf_idf[url].keys() == full_tf_idf[url].keys() and
+        all(abs(val - full_tf_idf[url][term]) < 1e-9 for term, val in incremental_tf_idf[url].items())
+        for url in full_tf_idf)
+
+
+results = {}
+with tempfile.TemporaryDirectory() as dirname:
+    store = openStore(os.path.join(dirname, 'newsapi_articles.jsonl'))
+    store.append(dict(articles[:first_docs]))
+    runIndexScript(dirname)
+
+    # new articles only have their own terms counted and merged in
+    store.append(dict(articles[first_docs:]))
+    results['added articles'] = sameIndex(runIndexScript(dirname), fullBuild(articles))
+
+    # indexed articles dropped from the store have to leave the index too
+    store.compact(keep=lambda key, value: key not in dropped_urls)
+    kept = [(url, text) for url, text in articles if url not in dropped_urls]
+    results['compacted store'] = sameIndex(runIndexScript(dirname), fullBuild(kept))
+
+for case, same in results.items():
+    print('Incremental index after {} same as a full build: {}'.format(case, same))
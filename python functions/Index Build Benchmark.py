@@ -0,0 +1,95 @@
+from nltk.stem import PorterStemmer
+from nltk.tokenize import word_tokenize
+from nltk.corpus import stopwords
+import nltk
+import time
+from index_builder import countDocumentTerms, buildIndexes
+
+# compare the old list.count postings construction with the single pass counter
+# builder on the Cranfield collection, run from the folder holding cran.all.1400
+
+# number of times each builder is run, the best time is reported
+repeats = 3
+
+nltk.download('stopwords')
+nltk.download('punkt')
+stop_words = set(stopwords.words('english'))
+ps = PorterStemmer()
+
+cranfield_docs = {}
+doc_num = -1
+
+with open('cran.all.1400', 'r') as txt_file:
+    for line in txt_file:
+        if line[:2] == '.I':
+            if doc_num != -1:
+                cranfield_docs[doc_num] = text
+            doc_num += 1
+            read_text = False
+            text = ''
+        elif line[:2] == '.W':
+            read_text = True
+        elif read_text:
+            text += line
+    cranfield_docs[doc_num] = text
+
+# tokenizing and stemming is the same for both builders so do it once up front
+start = time.perf_counter()
+document_terms = []
+for num, text in cranfield_docs.items():
+    stemmed_words = []
+    for word in word_tokenize(text):
+        if word.lower() not in stop_words and word.isalpha():
+            stemmed_words.append(ps.stem(word.lower()))
+    document_terms.append((num, stemmed_words))
+analysis_time = time.perf_counter() - start
+
+
+def oldBuild(document_terms):
+    # postings the way the index scripts used to build them, list.count for every posting
+    inverted_index_raw = {}
+    for num, stemmed_words in document_terms:
+        for stemmed_word in stemmed_words:
+            if stemmed_word in inverted_index_raw:
+                inverted_index_raw[stemmed_word].append(num)
+            else:
+                inverted_index_raw[stemmed_word] = [num]
+
+    inverted_index = {}
+    pointer_index = {}
+    for term in inverted_index_raw:
+        inverted_index[term] = {'freq': len(inverted_index_raw[term]), 'id': id(term)}
+        pointer_index[id(term)] = {}
+        for num in inverted_index_raw[term]:
+            if num not in pointer_index[id(term)]:
+                pointer_index[id(term)][num] = inverted_index_raw[term].count(num)
+    return inverted_index, pointer_index
+
+
+def bestTime(build):
+    # best wall time over the repeats
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = build(document_terms)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+old_time, (old_inverted_index, old_pointer_index) = bestTime(oldBuild)
+new_time, (new_inverted_index, new_pointer_index, _) = bestTime(
+    lambda document_terms: buildIndexes(countDocumentTerms(document_terms)))
+
+# both builders have to agree on every term frequency and posting
+same_postings = all(
+    old_inverted_index[term]['freq'] == new_inverted_index[term]['freq'] and
+    old_pointer_index[old_inverted_index[term]['id']] == new_pointer_index[new_inverted_index[term]['id']]
+    for term in old_inverted_index) and len(old_inverted_index) == len(new_inverted_index)
+
+print('Documents: {}, terms: {}, postings: {}'.format(
+    len(document_terms), len(new_inverted_index), sum(len(p) for p in new_pointer_index.values())))
+print('Tokenize and stem: {:.3f}s'.format(analysis_time))
+print('Old list.count postings build: {:.3f}s'.format(old_time))
+print('Counter postings build (incl. idf and tf*idf): {:.3f}s'.format(new_time))
+print('Speedup: {:.1f}x'.format(old_time / new_time))
+print('Same postings: {}'.format(same_postings))
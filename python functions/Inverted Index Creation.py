@@ -1,86 +1,101 @@
-from nltk.stem import PorterStemmer
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
 import nltk
 import json
-import math
-
-# use nltk library to get stopwords and import a Porter Stemmer
+import os
+from term_doc_matrix import buildTermDocMatrix
+from cooccurrence import buildCooccurIndex, saveCooccurIndex
+from binary_index import writeBinaryIndex
+from lsi import buildLatentIndex, saveLatentIndex
+from text_analysis import stem_cache
+from article_store import openStore
+from index_builder import analyzeDocuments, mergePostings, computeIdf, computeTfIdf
+from near_duplicates import NearDuplicateIndex
+from portfolio_queries import portfolioQueries
+
+# use nltk library to get stopwords and tokenizer data, the shared text analysis
+# module does the stop word removal and memoized Porter stemming
 nltk.download('stopwords')
 nltk.download('punkt')
-stop_words = set(stopwords.words('english'))
-ps = PorterStemmer()
-
-# build an inverted index w/ the document terms contained in the following .json
-articles_dict = {}
-with open('newsapi_articles.json', 'r') as json_file:
-    articles_dict = json.load(json_file)
-
-# create a raw inverted index
-inverted_index_raw = {}
-
-# import terms into 'raw' inverted index
-for url, text in articles_dict.items():
-    for word in word_tokenize(text):
-        if word.lower() not in stop_words and word.isalpha():
-            stemmed_word = ps.stem(word.lower())
-            if stemmed_word in inverted_index_raw:
-                inverted_index_raw[stemmed_word].append(url)
-            else:
-                inverted_index_raw[stemmed_word] = [url]
 
-# create a portfolio dictionary with company names and their stock tickers
-portfolio_dict = {}
+# stems from earlier runs are loaded so common words are never stemmed twice
+stem_cache.load('stem_cache.json')
+
+# set to False to rebuild the whole index from scratch instead of only adding new articles
+incremental = True
 
-with open('stock_portfolio.json', 'r') as json_file:
-    portfolio_dict = json.load(json_file)
+# number of processes used to tokenize and stem the articles, 1 keeps it in this process
+workers = os.cpu_count()
 
-all_stocks = list(x for v in portfolio_dict.values() for x in v)
-query_terms = [(stock['Name'].lower(), stock['Symbol'].lower()) for stock in all_stocks]
+# dimensions of the latent (lsi) document vectors, 0 skips building them
+lsi_rank = 200
 
-# create new dictionary for holding the stemmed query terms
-stemmed_query_terms = {}
+# build an inverted index w/ the document terms contained in the article store,
+# the texts are streamed from disk rather than loaded all at once
+articles_store = openStore('newsapi_articles.jsonl', 'newsapi_articles.json')
 
-# query terms must be tokenized and stemmed to match terms in inverted index
-for term in query_terms:
-    stemmed_term = []
-    for word in word_tokenize(term[0]):
-        if word not in stop_words and word.isalpha():
-            stemmed_word = ps.stem(word)
-            stemmed_term.append(stemmed_word)
-    stemmed_term.append(term[1])
-    stemmed_query_terms[term[0]] = stemmed_term
+# articles that are near copies of an earlier article (syndicated stories) are left out of
+# the index, signatures are shared with 'News API' and only articles not hashed yet are read
+# and hashed, this also catches duplicates stored before the fetch script checked for them
+near_duplicates = NearDuplicateIndex(filename='article_signatures.npz')
+for url, text in articles_store.streamKeys(url for url in articles_store.keys() if url not in near_duplicates):
+    near_duplicates.add(url, text)
+near_duplicates.save()
+print('Near duplicates: {}'.format(near_duplicates.stats()))
 
-# create inverted index and pointer index to document id frequency
+# inverted index and pointer index to document id frequency
 inverted_index = {}
 pointer_index = {}
+indexed_urls = set()
+
+# in incremental mode start from the index written by the last run
+index_files = ['inverted_index.json', 'pointer_index.json', 'article_tf_idf.json']
+if incremental and all(os.path.exists(filename) for filename in index_files):
+    with open('inverted_index.json', 'r') as json_file:
+        inverted_index = json.load(json_file)
+    with open('pointer_index.json', 'r') as json_file:
+        pointer_index = {int(term_id): urls for term_id, urls in json.load(json_file).items()}
+    with open('article_tf_idf.json', 'r') as json_file:
+        indexed_urls = set(json.load(json_file))
+    # postings can't be taken back out, rebuild if an indexed article turned out to be a duplicate
+    # or is no longer in the store (e.g. dropped by compacting it)
+    dropped_urls = [url for url in indexed_urls if url not in articles_store]
+    if dropped_urls or not indexed_urls.isdisjoint(near_duplicates.duplicate_of):
+        inverted_index = {}
+        pointer_index = {}
+        indexed_urls = set()
+
+# tokenize, stem and count the terms of each article across worker processes,
+# only articles not already indexed are read from the store
+new_articles = articles_store.streamKeys(url for url in articles_store.keys()
+                                         if url not in indexed_urls and url not in near_duplicates.duplicate_of)
+article_term_counts = analyzeDocuments(new_articles, workers)
 
-for term in inverted_index_raw:
-    inverted_index[term] = {'freq': len(inverted_index_raw[term]), 'id': id(term)}
-    pointer_index[id(term)] = {}
-    for url in inverted_index_raw[term]:
-        if url not in pointer_index[id(term)]:
-            pointer_index[id(term)][url] = inverted_index_raw[term].count(url)
+# create a portfolio dictionary with company names and their stock tickers
+portfolio_dict = dict(openStore('stock_portfolio.jsonl', 'stock_portfolio.json').stream())
 
-# n = number of documents
-n = len(articles_dict)
+# query terms must be tokenized and stemmed to match terms in inverted index, a company
+# moving on several days is only analyzed once
+stemmed_query_terms, _ = portfolioQueries(portfolio_dict)
 
-# create dictionary of term idf's
-term_idf_dict = {}
+# merge the counted term frequencies of the new articles into the
+# inverted index and pointer index, new terms get ids after the largest id in use
+mergePostings(inverted_index, pointer_index, article_term_counts)
 
-for term in inverted_index.keys():
-    term_idf_dict[term] = math.log2(n / len(pointer_index[inverted_index[term]['id']]))
+# n = number of documents, the near duplicates aren't indexed
+article_urls = [url for url in articles_store.keys() if url not in near_duplicates.duplicate_of]
+n = len(article_urls)
+
+# create dictionary of term idf's
+# n changes with every new article so every idf and tf*idf value is recomputed,
+# this only walks the pointer index and never re-tokenizes old articles
+term_idf_dict = computeIdf(inverted_index, pointer_index, n)
 
 # create a tf_idf dictionary keyed on the url of the article
-article_tf_idf_dict = {}
-for url in articles_dict:
-    article_tf_idf_dict[url] = {}
+article_tf_idf_dict = computeTfIdf(inverted_index, pointer_index, term_idf_dict, article_urls)
 
-for term in inverted_index.keys():
-    idf = term_idf_dict[term]
-    for included_url in pointer_index[inverted_index[term]['id']].keys():
-        count = pointer_index[inverted_index[term]['id']][included_url]
-        article_tf_idf_dict[included_url][term] = (idf * count)
+# keep the top related terms of each term so global query expansion doesn't need
+# the full term co-occurrence matrix at query time
+term_doc_matrix = buildTermDocMatrix(article_tf_idf_dict)
+cooccur_index = buildCooccurIndex(term_doc_matrix, 10)
 
 # write dictionaries to json files for easy reloading for future sessions
 with open('inverted_index.json', 'w') as json_file:
@@ -93,4 +108,19 @@ with open('article_tf_idf.json', 'w') as json_file:
     json.dump(article_tf_idf_dict, json_file)
 
 with open('query_terms.json', 'w') as json_file:
-    json.dump(stemmed_query_terms, json_file)
\ No newline at end of file
+    json.dump(stemmed_query_terms, json_file)
+
+saveCooccurIndex(cooccur_index, 'cooccur_index.json')
+
+# also write the memory mappable binary index used for fast query startup
+# publish dates are stored as a day number column of the index so date windows are a mask
+article_dates = dict(openStore('article_dates.jsonl').stream())
+writeBinaryIndex('article_index', term_doc_matrix, inverted_index, pointer_index, article_dates)
+
+# and the low rank document vectors of the optional latent retrieval mode, the factorization is
+# redone every run since every tf*idf weight changes with n
+if lsi_rank:
+    saveLatentIndex('article_lsi', buildLatentIndex(term_doc_matrix, lsi_rank))
+
+stem_cache.save('stem_cache.json')
+print('Stem cache: {}'.format(stem_cache.stats()))
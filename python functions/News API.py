@@ -1,8 +1,8 @@
 from newsapi import NewsApiClient
 import datetime
-import json
-import newspaper
-from newspaper import Article
+from article_store import openStore
+from news_fetch import fetchArticles, fetchDailyArticles
+from near_duplicates import NearDuplicateIndex, filterNearDuplicates
 
 # use this api to request online articles relating to certain topics
 # check https://newsapi.org/docs for more information about this API
@@ -33,37 +33,38 @@ past_month_dates = []
 for x in range(21):
     past_month_dates.append(datetime.date.today() + datetime.timedelta(days=-x))
 
-business_tech_articles = []
-for date in past_month_dates:
-    daily_request = news_api.get_everything(
-        sources=','.join([str(x) for x in business_tech]), language='en',
-        from_param=str(date), to=str(date), page_size=100, page=1)
-    business_tech_articles.append(daily_request['articles'])
+# the daily requests are sent together instead of one after another
+business_tech_articles = fetchDailyArticles(news_api, ','.join([str(x) for x in business_tech]),
+                                            past_month_dates)
 
 business_tech_articles = [item for sublist in business_tech_articles for item in sublist]
 
 # use list of urls as document set
 business_tech_articles_urls = list(set(article['url'] for article in business_tech_articles))
 
-# article dictionary will have url as key, text of article as value
-all_articles_dict = {}
+# article store has url as key, text of article as value, new articles are appended
+# to the end so the articles already downloaded are never rewritten
+articles_store = openStore('newsapi_articles.jsonl', 'newsapi_articles.json')
 
-# create json file from dictionary, append values if running from a new date
-with open('newsapi_articles.json', 'r') as json_file:
-    dict_data = json.load(json_file)
-    all_articles_dict.update(dict_data)
+# library 'newspaper' does web scrape of urls, the downloads run in a pool of threads
+# sharing one http session, with timeouts, retries and a limit on requests per host
+# urls already found to be near duplicates are skipped too, they aren't kept in the store
+near_duplicates = NearDuplicateIndex(filename='article_signatures.npz')
+new_urls = [article_url for article_url in business_tech_articles_urls
+            if article_url not in articles_store and article_url not in near_duplicates]
+new_articles = fetchArticles(new_urls, max_workers=16, per_host_interval=1.0)
 
-# library 'newspaper' does web scrape of urls by calling .download() and .parse()
-for article_url in business_tech_articles_urls:
-    if article_url not in all_articles_dict:
-        article = Article(article_url)
-        try:
-            article.download()
-            article.parse()
-        except newspaper.article.ArticleException:
-            continue
-        all_articles_dict[article_url] = article.title + ' ' + article.text
-
-with open('newsapi_articles.json', 'w') as json_file:
-    json.dump(all_articles_dict, json_file)
+# the same story syndicated across outlets is only stored once, the first copy seen,
+# only the new articles are hashed, signatures of earlier runs are loaded from disk
+kept_articles = dict(filterNearDuplicates(near_duplicates, new_articles.items()))
+articles_store.append(kept_articles)
+near_duplicates.save()
 
+# publish day of each stored article, used to match articles with the movers of nearby days
+# every stored article seen in this run's listings gets its date, so articles stored before
+# dates were kept are filled in too, the store never rewrites a date it already has
+published_dates = {article['url']: article['publishedAt'][:10] for article in business_tech_articles
+                   if article.get('publishedAt')}
+dates_store = openStore('article_dates.jsonl')
+dates_store.append({url: date for url, date in published_dates.items() if url in articles_store})
+print('Near duplicates: {}'.format(near_duplicates.stats()))
@@ -0,0 +1,121 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+from news_fetch import fetchArticles
+
+# check the concurrent article fetch against two local stub http servers, nothing is downloaded
+# covers retries of failed responses, timeouts of slow pages and the per host rate limit
+
+# seconds between requests to the same host
+per_host_interval = 0.3
+
+# seconds before a request is given up on, the slow page takes longer than this
+timeout = 0.5
+slow_seconds = 2.0
+
+# article pages the stub servers hand out
+article_html = ('<html><head><title>Story {}</title></head><body><article><p>' +
+                'Oracle shares rose sharply today after quarterly earnings beat expectations. ' * 20 +
+                '</p></article></body></html>')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # /flaky fails with 503 the first time, /missing is a 404, /slow answers after slow_seconds,
+    # any other path is an article, every request is logged with the time it came in
+    requests_seen = None
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.requests_seen.append((self.path, time.monotonic()))
+            tries = sum(1 for path, _ in self.requests_seen if path == self.path)
+        if self.path == '/flaky' and tries == 1:
+            self.send_response(503)
+            self.end_headers()
+            return
+        if self.path == '/missing':
+            self.send_response(404)
+            self.end_headers()
+            return
+        if self.path == '/slow':
+            time.sleep(slow_seconds)
+        body = article_html.format(self.path).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # the fetch already timed out and hung up on the slow page
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def startStub():
+    # stub server on a free port in a background thread, gives (server, base url, request log)
+    requests_seen = []
+    handler = type('BoundStubHandler', (StubHandler,), {'requests_seen': requests_seen})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{}'.format(server.server_address[1]), requests_seen
+
+
+def minGap(requests_seen):
+    # smallest time between two requests in a request log
+    times = sorted(seen for _, seen in requests_seen)
+    return min((b - a for a, b in zip(times, times[1:])), default=float('inf'))
+
+
+failures = []
+
+# retries and timeouts, no rate limit
+server, base, requests_seen = startStub()
+urls = [base + '/a{}'.format(i) for i in range(8)] + [base + '/flaky', base + '/missing', base + '/slow']
+start = time.perf_counter()
+articles = fetchArticles(urls, max_workers=8, per_host_interval=0, timeout=timeout, retries=1)
+elapsed = time.perf_counter() - start
+flaky_tries = sum(1 for path, _ in requests_seen if path == '/flaky')
+slow_tries = sum(1 for path, _ in requests_seen if path == '/slow')
+print('Fetched {} of {} urls in {:.2f}s'.format(len(articles), len(urls), elapsed))
+print('Flaky page requested {} times, slow page requested {} times'.format(flaky_tries, slow_tries))
+if sorted(articles) != sorted(urls[:9]):
+    failures.append('expected the 8 articles and the flaky page, got {}'.format(sorted(articles)))
+if flaky_tries != 2:
+    failures.append('the 503 of the flaky page was not retried once')
+if not all('Oracle shares rose' in text for text in articles.values()):
+    failures.append('an article text was not parsed')
+# the slow page times out on the first try and its one retry, it must not hold up the fetch
+if elapsed > slow_seconds * 2:
+    failures.append('the slow page was waited on for {:.2f}s, timeout is {}s'.format(elapsed, timeout))
+server.shutdown()
+server.server_close()
+
+# per host rate limit, two hosts fetched at once only wait on their own earlier requests
+server_a, base_a, requests_a = startStub()
+server_b, base_b, requests_b = startStub()
+urls = [base + '/a{}'.format(i) for base in (base_a, base_b) for i in range(5)]
+start = time.perf_counter()
+articles = fetchArticles(urls, max_workers=8, per_host_interval=per_host_interval, timeout=timeout)
+elapsed = time.perf_counter() - start
+print('Rate limited fetch of {} urls over 2 hosts in {:.2f}s'.format(len(articles), elapsed))
+print('Smallest gap between requests to one host: {:.3f}s, {:.3f}s (limit {}s)'.format(
+    minGap(requests_a), minGap(requests_b), per_host_interval))
+if len(articles) != len(urls):
+    failures.append('only {} of {} rate limited urls were fetched'.format(len(articles), len(urls)))
+# a little slack for the time between the limiter letting a request go and the server seeing it
+if min(minGap(requests_a), minGap(requests_b)) < per_host_interval * 0.9:
+    failures.append('requests to one host came closer together than {}s'.format(per_host_interval))
+# each host needs 4 intervals, the hosts don't wait on each other so it is well under 8
+if elapsed > per_host_interval * 6:
+    failures.append('hosts waited on each other, {:.2f}s for {} urls'.format(elapsed, len(urls)))
+for server in (server_a, server_b):
+    server.shutdown()
+    server.server_close()
+
+print('Failed checks: {}'.format(len(failures)))
+for failure in failures:
+    print('\t{}'.format(failure))
@@ -0,0 +1,31 @@
+from query_service import QueryService, makeServer
+
+# long running query service, loads the binary index, co-occurrence neighbours and company
+# query terms once and answers queries over http on this machine only, nothing is downloaded
+# so the nltk stopwords and punkt data must already be installed
+# run from the folder holding the index files, e.g.
+#   curl 'localhost:8080/portfolio?mode=global&k=3'
+#   curl 'localhost:8080/query?q=jet+engine+noise&mode=local'
+#   curl -d '{"queries": {"a": "boundary layer", "b": ["wing", "slipstream"]}}' localhost:8080/batch
+#   curl localhost:8080/metrics
+
+# set to True to serve the cranfield test index instead of the article index
+test = False
+
+host = '127.0.0.1'
+port = 8080
+
+if test:
+    service = QueryService('cranfield_index', 'cranfield_cooccur_index.json', 'cranfield_query_terms.json')
+else:
+    service = QueryService('article_index', 'cooccur_index.json', 'query_terms.json')
+
+server = makeServer(service, host, port)
+print('Serving {} documents on http://{}:{}'.format(len(service.term_doc_matrix), host, port))
+try:
+    server.serve_forever()
+except KeyboardInterrupt:
+    pass
+finally:
+    server.server_close()
+    print('Metrics: {}'.format(service.stats()))
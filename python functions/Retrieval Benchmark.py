@@ -0,0 +1,158 @@
+import nltk
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from text_analysis import analyzeText
+from index_builder import analyzeDocuments, buildIndexes
+from term_doc_matrix import buildTermDocMatrix, buildQueryMatrix
+from cooccurrence import buildCooccurIndex, expandTermsFromIndex
+from scoring import cosineScores
+from local_analysis import localExpandAndQuery
+from topk_retrieval import buildImpactPostings, maxScoreTopK
+from collection_reader import readCollection, readQrels
+from lsi import buildLatentIndex, latentScores
+from bm25 import buildBM25, bm25Scores
+from evaluation import qrelsMatrix, scoreMatrix, evaluate
+from synthetic_corpus import generateDocuments, generateQueries
+
+# time every stage of the retrieval pipeline on the Cranfield collection (or a synthetic one),
+# run from the folder holding cran.all.1400, cran.qry and cranqrel
+# results go to benchmark_results/<commit>.json so runs can be compared across commits
+
+# set to a number of documents (e.g. 100000) to run on a synthetic corpus instead of Cranfield
+synthetic_docs = 0
+
+# number of processes for tokenizing and stemming, 1 keeps it in this process
+workers = 1
+
+# tracing memory slows the python heavy stages down, set to False for timings only
+trace_memory = True
+
+# expansion terms per query term, top k for the pruned retrieval, dimensions of the lsi vectors,
+# thresholds for precision / recall
+n = 4
+k = 10
+lsi_rank = 200
+global_threshold = .26
+local_threshold = .24
+
+nltk.download('stopwords')
+nltk.download('punkt')
+
+stages = {}
+
+
+def runStage(name, func, num_queries=None):
+    # run one stage, keep its wall time, peak traced memory and queries per second
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    wall_time = time.perf_counter() - start
+    stage = {'wall_time': wall_time}
+    if trace_memory:
+        stage['peak_memory_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    if num_queries:
+        stage['queries_per_sec'] = num_queries / wall_time if wall_time else float('inf')
+    stages[name] = stage
+    print('{:<18} {:8.3f}s {}'.format(name, wall_time, ', '.join(
+        '{} {:.1f}'.format(key, val) for key, val in stage.items() if key != 'wall_time')))
+    return result
+
+
+def readCranfield():
+    # documents, queries and relevance lists the same way 'Read Cranfield Collection' reads them
+    docs = {record['num'] - 1: record.get('W', '') for record in readCollection('cran.all.1400')}
+    queries = {record['num']: record.get('W', '') for record in readCollection('cran.qry')}
+    query_rel = {num: [] for num in queries}
+    for query_num, doc_num, _ in readQrels('cranqrel'):
+        query_rel[int(query_num)].append(int(doc_num))
+    return docs, queries, query_rel
+
+
+def readSynthetic():
+    docs = dict(generateDocuments(synthetic_docs))
+    queries, query_rel = generateQueries(synthetic_docs)
+    return docs, queries, query_rel
+
+
+docs, queries, query_rel = runStage('parse', readSynthetic if synthetic_docs else readCranfield)
+stemmed_query_terms = runStage('query analysis', lambda: {num: analyzeText(text) for num, text in queries.items()},
+                               len(queries))
+document_term_counts = runStage('tokenize and stem', lambda: analyzeDocuments(docs.items(), workers))
+inverted_index, pointer_index, document_tf_idf_dict = runStage(
+    'index build', lambda: buildIndexes(document_term_counts))
+term_doc_matrix = runStage('matrix build', lambda: buildTermDocMatrix(document_tf_idf_dict))
+runStage('document norms', lambda: term_doc_matrix.doc_norms)
+cooccur_index = runStage('co-occurrence', lambda: buildCooccurIndex(term_doc_matrix, 10))
+
+
+def globalExpansion():
+    return {num: list(set(terms + expandTermsFromIndex(cooccur_index, terms, n)))
+            for num, terms in stemmed_query_terms.items()}
+
+
+def scoreAll(query_term_dict):
+    scores = cosineScores(buildQueryMatrix(query_term_dict, term_doc_matrix), term_doc_matrix.matrix,
+                          term_doc_matrix.doc_norms)
+    return dict(zip(query_term_dict, scores))
+
+
+plain_results = runStage('plain scoring', lambda: scoreAll(stemmed_query_terms), len(queries))
+expanded_query_terms = runStage('global expansion', globalExpansion, len(queries))
+global_results = runStage('global scoring', lambda: scoreAll(expanded_query_terms), len(queries))
+local_results = runStage('local analysis', lambda: localExpandAndQuery(term_doc_matrix, stemmed_query_terms, n),
+                         len(queries))
+latent_index = runStage('lsi build', lambda: buildLatentIndex(term_doc_matrix, lsi_rank))
+lsi_results = runStage('lsi scoring', lambda: dict(zip(stemmed_query_terms,
+                                                       latentScores(latent_index, stemmed_query_terms))), len(queries))
+bm25_scorer = runStage('bm25 weights', lambda: buildBM25(term_doc_matrix, inverted_index, pointer_index))
+bm25_results = runStage('bm25 scoring', lambda: dict(zip(stemmed_query_terms,
+                                                         bm25Scores(bm25_scorer, stemmed_query_terms))), len(queries))
+impact_postings = runStage('impact postings', lambda: buildImpactPostings(term_doc_matrix))
+runStage('top k retrieval', lambda: [maxScoreTopK(impact_postings, terms, k)
+                                     for terms in expanded_query_terms.values()], len(queries))
+
+# precision / recall over the thresholds plus the ranked measures of both expansions
+query_names = list(query_rel)
+qrels = qrelsMatrix(query_rel, query_names, term_doc_matrix.doc_ids)
+quality = {'plain': evaluate(scoreMatrix(plain_results, query_names, len(term_doc_matrix)), qrels),
+           'bm25': evaluate(scoreMatrix(bm25_results, query_names, len(term_doc_matrix)), qrels),
+           'lsi': evaluate(scoreMatrix(lsi_results, query_names, len(term_doc_matrix)), qrels),
+           'global': evaluate(scoreMatrix(global_results, query_names, len(term_doc_matrix)), qrels,
+                              threshold=global_threshold),
+           'local': evaluate(scoreMatrix(local_results, query_names, len(term_doc_matrix)), qrels,
+                             threshold=local_threshold)}
+print('Quality: {}'.format(quality))
+
+try:
+    commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                     cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+except (OSError, subprocess.CalledProcessError):
+    commit = 'unknown'
+
+results = {
+    'commit': commit,
+    'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    'python': platform.python_version(),
+    'collection': 'synthetic' if synthetic_docs else 'cranfield',
+    'num_docs': len(docs),
+    'num_queries': len(queries),
+    'num_terms': term_doc_matrix.shape[1],
+    'num_postings': int(term_doc_matrix.matrix.nnz),
+    'settings': {'workers': workers, 'trace_memory': trace_memory, 'n': n, 'k': k,
+                 'lsi_rank': lsi_rank, 'global_threshold': global_threshold, 'local_threshold': local_threshold},
+    'stages': stages,
+    'quality': quality
+}
+
+os.makedirs('benchmark_results', exist_ok=True)
+results_filename = os.path.join('benchmark_results', '{}_{}_{}.json'.format(
+    commit, results['collection'], results['num_docs']))
+with open(results_filename, 'w') as json_file:
+    json.dump(results, json_file, indent=2)
+print('Wrote {}'.format(results_filename))
@@ -1,5 +1,5 @@
 import robin_stocks as r
-import json
+from article_store import openStore
 from datetime import date
 
 # *****NOTE: won't be able to run without two factor login message sent to my phone*******
@@ -24,12 +24,6 @@ for stock in stocks_down:
     portfolio.append({'Symbol': stock['symbol'],
                       'Name': r.get_name_by_symbol(stock['symbol'])})
 
-portfolio_dict = {str(date.today()): portfolio}
-
-# write the stocks to a json file, update if adding on an extra day
-with open('stock_portfolio.json', 'r') as json_file:
-    dict_data = json.load(json_file)
-    portfolio_dict.update(dict_data)
-
-with open('stock_portfolio.json', 'w') as json_file:
-    json.dump(portfolio_dict, json_file)
+# append the stocks to the portfolio store, a day already stored is left as it was
+portfolio_store = openStore('stock_portfolio.jsonl', 'stock_portfolio.json')
+portfolio_store.append({str(date.today()): portfolio})
@@ -0,0 +1,53 @@
+import json
+import time
+import numpy as np
+from term_doc_matrix import buildTermDocMatrix, buildQueryMatrix
+from scoring import cosineScores
+from topk_retrieval import buildImpactPostings, maxScoreTopK
+
+# check the MaxScore top k retrieval against brute force cosine scoring of every document
+# on the Cranfield queries, run from the folder holding the cranfield json files
+
+# number of results per query to compare
+k = 10
+
+with open('cranfield_document_tf_idf.json', 'r') as json_file:
+    document_tf_idf_dict = json.load(json_file)
+with open('cranfield_query_terms.json', 'r') as json_file:
+    stemmed_query_terms = json.load(json_file)
+
+term_doc_matrix = buildTermDocMatrix(document_tf_idf_dict)
+impact_postings = buildImpactPostings(term_doc_matrix)
+
+start = time.perf_counter()
+scores = cosineScores(buildQueryMatrix(stemmed_query_terms, term_doc_matrix), term_doc_matrix.matrix,
+                      term_doc_matrix.doc_norms)
+scores = np.nan_to_num(scores)
+brute_force_time = time.perf_counter() - start
+
+stats = {}
+start = time.perf_counter()
+maxscore_results = [maxScoreTopK(impact_postings, query_terms, k, stats)
+                    for query_terms in stemmed_query_terms.values()]
+maxscore_time = time.perf_counter() - start
+
+# rankings can only differ in the order of tied scores, so compare the kth best scores and
+# check every returned document has the score brute force gives it
+mismatches = 0
+for q, top in enumerate(maxscore_results):
+    expected = np.sort(scores[q][scores[q] > 0])[::-1][:k]
+    got = np.array([score for _, score in top])
+    same_scores = len(got) == len(expected) and np.allclose(got, expected)
+    same_docs = all(np.isclose(scores[q][row], score) for row, score in top)
+    if not (same_scores and same_docs):
+        mismatches += 1
+
+total_postings = sum(len(impact_postings.postings(term)[0])
+                     for query_terms in stemmed_query_terms.values()
+                     for term in set(query_terms) if term in impact_postings.term_index)
+print('Queries: {}, documents: {}, k = {}'.format(len(maxscore_results), len(term_doc_matrix), k))
+print('Brute force cosine (all queries, one matrix product): {:.3f}s'.format(brute_force_time))
+print('MaxScore top k: {:.3f}s'.format(maxscore_time))
+print('Postings of query terms: {}, touched: {}, documents left in the running: {}'.format(
+    total_postings, stats['postings_touched'], stats['candidates']))
+print('Queries whose top {} differ from brute force: {}'.format(k, mismatches))
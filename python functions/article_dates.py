@@ -0,0 +1,18 @@
+import numpy as np
+
+# publish days of articles as int32 day numbers, kept free of the text analysis imports so the
+# binary index can store them without pulling in nltk
+
+# day number given to articles with no known publish date
+no_date = np.iinfo(np.int32).min
+
+
+def dayNumber(date):
+    # days since 1970-01-01 of a 'YYYY-MM-DD...' string (an iso timestamp works too)
+    return int(np.datetime64(str(date)[:10], 'D').astype(np.int64))
+
+
+def docDays(doc_ids, doc_dates):
+    # int32 publish day of every document row, doc_dates is {doc id: date string}
+    return np.array([dayNumber(doc_dates[doc_id]) if doc_dates.get(doc_id) else no_date
+                     for doc_id in doc_ids], dtype=np.int32)
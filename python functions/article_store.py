@@ -0,0 +1,214 @@
+import json
+import os
+
+
+class ArticleStore:
+    # append only store of json lines, one {"key": ..., "value": ...} record per line
+    # a side file of "offset<tab>key" lines maps each key to where its record starts,
+    # so lookups seek straight to the record and opening the store never reads the texts
+    def __init__(self, filename):
+        self.filename = filename
+        self.index_filename = filename + '.idx'
+        self.offsets = {}
+        if not os.path.exists(self.filename):
+            open(self.filename, 'w').close()
+        self.finishCompaction()
+        self.recover()
+
+    def finishCompaction(self):
+        # a '.compacting' marker means compact had fully written the new data and index files and
+        # was swapping them in, so finish both renames, without the marker any new files are
+        # leftovers of a compaction that never got that far and the old files are still a pair
+        marker_filename = self.filename + '.compacting'
+        tmp_filename = self.filename + '.compact'
+        tmp_index_filename = self.index_filename + '.compact'
+        if os.path.exists(marker_filename):
+            if os.path.exists(tmp_filename):
+                os.replace(tmp_filename, self.filename)
+            if os.path.exists(tmp_index_filename):
+                os.replace(tmp_index_filename, self.index_filename)
+            syncDirectory(self.filename)
+            os.remove(marker_filename)
+        else:
+            for leftover in (tmp_filename, tmp_index_filename):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+    def recover(self):
+        # load the offset index, then pick up any records written after it (a crash between
+        # the two writes) and cut off a last line that was only partly written
+        # an index pointing past the end of the data file doesn't belong to it, the index is
+        # then rebuilt by reading every record
+        indexed_end = 0
+        torn_index = False
+        if os.path.exists(self.index_filename):
+            with open(self.index_filename, 'r', encoding='utf-8') as idx_file:
+                for line in idx_file:
+                    if not line.endswith('\n'):
+                        torn_index = True
+                        break
+                    offset, key = line[:-1].split('\t', 1)
+                    self.offsets[key] = int(offset)
+                    indexed_end = max(indexed_end, int(offset))
+        data_size = os.path.getsize(self.filename)
+        if self.offsets and indexed_end >= data_size:
+            self.offsets = {}
+            indexed_end = 0
+            torn_index = True
+
+        missing = []
+        with open(self.filename, 'rb+') as data_file:
+            data_file.seek(indexed_end)
+            if self.offsets:
+                data_file.readline()
+            good_end = data_file.tell()
+            for line in iter(data_file.readline, b''):
+                if not line.endswith(b'\n'):
+                    break
+                key = json.loads(line)['key']
+                if key not in self.offsets:
+                    self.offsets[key] = good_end
+                    missing.append((good_end, key))
+                good_end = data_file.tell()
+            if good_end < data_size:
+                data_file.truncate(good_end)
+
+        # rewrite the index file if it was behind or had a torn last line
+        if missing or torn_index or not os.path.exists(self.index_filename):
+            self.writeIndex()
+
+    def writeIndex(self, index_filename=None, offsets=None):
+        # write the whole offset index, used after recovery and compaction
+        offsets = self.offsets if offsets is None else offsets
+        with open(index_filename or self.index_filename, 'w', encoding='utf-8') as idx_file:
+            for key, offset in offsets.items():
+                idx_file.write('{}\t{}\n'.format(offset, key))
+            idx_file.flush()
+            os.fsync(idx_file.fileno())
+
+    def scanIndex(self):
+        # throw the offset index away and rebuild it from the records in the data file
+        self.offsets = {}
+        if os.path.exists(self.index_filename):
+            os.remove(self.index_filename)
+        self.recover()
+
+    def readRecord(self, data_file, key):
+        # value of a stored key, the key written with the record is checked so an index that
+        # doesn't match the data file is rebuilt instead of handing back another record
+        for _ in range(2):
+            if key not in self.offsets:
+                break
+            data_file.seek(self.offsets[key])
+            try:
+                record = json.loads(data_file.readline())
+            except ValueError:
+                record = None
+            if isinstance(record, dict) and record.get('key') == key:
+                return record['value']
+            self.scanIndex()
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def keys(self):
+        return list(self.offsets)
+
+    def get(self, key, default=None):
+        # read a single record by seeking to its offset
+        if key not in self.offsets:
+            return default
+        with open(self.filename, 'rb') as data_file:
+            try:
+                return self.readRecord(data_file, key)
+            except KeyError:
+                return default
+
+    def append(self, records):
+        # add records whose key isn't stored yet, existing keys are never rewritten
+        # the records are flushed to disk before their offsets are added to the index
+        new_offsets = []
+        with open(self.filename, 'ab') as data_file:
+            for key, value in records.items():
+                if key in self.offsets:
+                    continue
+                new_offsets.append((data_file.tell(), key))
+                data_file.write(json.dumps({'key': key, 'value': value}).encode('utf-8') + b'\n')
+            data_file.flush()
+            os.fsync(data_file.fileno())
+
+        with open(self.index_filename, 'a', encoding='utf-8') as idx_file:
+            for offset, key in new_offsets:
+                self.offsets[key] = offset
+                idx_file.write('{}\t{}\n'.format(offset, key))
+        return len(new_offsets)
+
+    def stream(self):
+        # generator of (key, value) records in the order they were written, one line in memory at a time
+        with open(self.filename, 'rb') as data_file:
+            for line in data_file:
+                record = json.loads(line)
+                yield record['key'], record['value']
+
+    def streamKeys(self, keys):
+        # generator of (key, value) of only the given stored keys, in the order they were written,
+        # seeking to each record so the rest of the store is never read
+        keys = sorted((key for key in set(keys) if key in self.offsets), key=self.offsets.get)
+        with open(self.filename, 'rb') as data_file:
+            for key in keys:
+                try:
+                    yield key, self.readRecord(data_file, key)
+                except KeyError:
+                    continue
+
+    def compact(self, keep=None):
+        # rewrite the store with one record per key and a fresh index, the new files
+        # replace the old ones only once they are both fully written, a marker file is kept
+        # while they are swapped in so a crash between the two renames is finished on open
+        # keep(key, value) can return False to drop a record, e.g. to age out old articles
+        tmp_filename = self.filename + '.compact'
+        tmp_index_filename = self.index_filename + '.compact'
+        marker_filename = self.filename + '.compacting'
+        offsets = {}
+        with open(tmp_filename, 'wb') as tmp_file:
+            for key, value in self.stream():
+                if key in offsets or (keep is not None and not keep(key, value)):
+                    continue
+                offsets[key] = tmp_file.tell()
+                tmp_file.write(json.dumps({'key': key, 'value': value}).encode('utf-8') + b'\n')
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        self.writeIndex(tmp_index_filename, offsets)
+
+        with open(marker_filename, 'w') as marker_file:
+            marker_file.flush()
+            os.fsync(marker_file.fileno())
+        syncDirectory(self.filename)
+        os.replace(tmp_filename, self.filename)
+        os.replace(tmp_index_filename, self.index_filename)
+        syncDirectory(self.filename)
+        os.remove(marker_filename)
+        self.offsets = offsets
+
+
+def syncDirectory(filename):
+    # flush the renames in the folder of a file to disk, folders can't be opened on windows
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def openStore(filename, old_json_filename=None):
+    # open a store, the first time also bring in the records of the old whole-file json dictionary
+    store = ArticleStore(filename)
+    if old_json_filename is not None and not len(store) and os.path.exists(old_json_filename):
+        with open(old_json_filename, 'r') as json_file:
+            store.append(json.load(json_file))
+    return store
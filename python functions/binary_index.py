@@ -0,0 +1,113 @@
+import json
+import os
+import numpy as np
+from scipy import sparse
+from term_doc_matrix import TermDocMatrix
+from article_dates import docDays
+
+# bump when the layout of the arrays changes so old index folders are rebuilt
+format_version = 2
+
+
+def writeBinaryIndex(dirname, term_doc_matrix, inverted_index=None, pointer_index=None, doc_dates=None,
+                     weight_dtype=np.float32):
+    # write the index as flat numpy arrays in a folder so it can be memory mapped
+    # doc_* arrays are the csr rows of the tf*idf matrix, term_* arrays are the postings of each term
+    # tf*idf weights are stored as weight_dtype (float32, or float16 to halve them again), norms
+    # and idf as float32, the scores computed from them are float64 as before
+    # give the inverted and pointer index to also store the raw term counts of every posting and
+    # the length (total term count) of every document, used by the bm25 scorer
+    # give {doc id: 'YYYY-MM-DD'} publish dates to also store an int32 day number of every document
+    os.makedirs(dirname, exist_ok=True)
+    matrix = term_doc_matrix.matrix
+    by_term = matrix.tocsc()
+    by_term.sort_indices()
+    num_docs, num_terms = matrix.shape
+    doc_freq = np.diff(by_term.indptr)
+    with np.errstate(divide='ignore'):
+        idf = np.where(doc_freq > 0, np.log2(num_docs / np.maximum(doc_freq, 1)), 0)
+
+    arrays = {
+        'doc_indptr': matrix.indptr.astype(np.int64),
+        'doc_terms': matrix.indices.astype(np.int32),
+        'doc_weights': matrix.data.astype(weight_dtype),
+        'doc_norms': term_doc_matrix.doc_norms.astype(np.float32),
+        'term_indptr': by_term.indptr.astype(np.int64),
+        'term_docs': by_term.indices.astype(np.int32),
+        'term_weights': by_term.data.astype(weight_dtype),
+        'idf': idf.astype(np.float32),
+    }
+    if inverted_index is not None and pointer_index is not None:
+        counts = postingCounts(term_doc_matrix, by_term, inverted_index, pointer_index)
+        # counts of a term in one document rarely pass 65535, keep them in half the space when they don't
+        arrays['term_counts'] = counts.astype(np.uint16) if counts.size and counts.max() < 2 ** 16 else counts
+        arrays['doc_lengths'] = np.bincount(by_term.indices, weights=counts, minlength=num_docs).astype(np.int32)
+    if doc_dates is not None:
+        arrays['doc_days'] = docDays([str(doc_id) for doc_id in term_doc_matrix.doc_ids],
+                                     {str(doc_id): date for doc_id, date in doc_dates.items()})
+    for name, array in arrays.items():
+        np.save(os.path.join(dirname, name + '.npy'), array)
+
+    # terms and document ids are one per line, urls and stems never hold a newline
+    with open(os.path.join(dirname, 'terms.txt'), 'w', encoding='utf-8') as txt_file:
+        txt_file.write('\n'.join(term_doc_matrix.terms))
+    with open(os.path.join(dirname, 'doc_ids.txt'), 'w', encoding='utf-8') as txt_file:
+        txt_file.write('\n'.join(str(doc_id) for doc_id in term_doc_matrix.doc_ids))
+    with open(os.path.join(dirname, 'meta.json'), 'w') as json_file:
+        json.dump({'format_version': format_version, 'num_docs': num_docs, 'num_terms': num_terms,
+                   'num_postings': int(matrix.nnz), 'index_version': term_doc_matrix.version,
+                   'arrays': sorted(arrays)}, json_file)
+
+
+def postingCounts(term_doc_matrix, by_term, inverted_index, pointer_index):
+    # raw term counts lined up with the term_docs postings array
+    # pointer index keys are strings once read back from json, ints when built in the same run
+    counts = np.zeros(by_term.nnz, dtype=np.int32)
+    doc_ids = [str(doc_id) for doc_id in term_doc_matrix.doc_ids]
+    for col, term in enumerate(term_doc_matrix.terms):
+        term_id = inverted_index[term]['id']
+        term_postings = pointer_index.get(term_id, pointer_index.get(str(term_id), {}))
+        term_postings = {str(doc_key): count for doc_key, count in term_postings.items()}
+        for i in range(by_term.indptr[col], by_term.indptr[col + 1]):
+            counts[i] = term_postings.get(doc_ids[by_term.indices[i]], 0)
+    return counts
+
+
+class BinaryIndex:
+    # an index folder written by writeBinaryIndex, arrays are memory mapped by default
+    # so opening it only reads the vocabulary and document ids
+    def __init__(self, dirname, mmap=True):
+        self.dirname = dirname
+        with open(os.path.join(dirname, 'meta.json'), 'r') as json_file:
+            self.meta = json.load(json_file)
+        if self.meta['format_version'] != format_version:
+            raise ValueError('{} has index format {}, expected {}, rebuild it with Convert Index.py'.format(
+                dirname, self.meta['format_version'], format_version))
+
+        mmap_mode = 'r' if mmap else None
+        for name in self.meta['arrays']:
+            setattr(self, name, np.load(os.path.join(dirname, name + '.npy'), mmap_mode=mmap_mode))
+        with open(os.path.join(dirname, 'terms.txt'), 'r', encoding='utf-8') as txt_file:
+            terms = txt_file.read().split('\n') if self.meta['num_terms'] else []
+        with open(os.path.join(dirname, 'doc_ids.txt'), 'r', encoding='utf-8') as txt_file:
+            doc_ids = txt_file.read().split('\n') if self.meta['num_docs'] else []
+
+        matrix = sparse.csr_matrix((self.doc_weights, self.doc_terms, self.doc_indptr),
+                                   shape=(self.meta['num_docs'], self.meta['num_terms']), copy=False)
+        self.matrix = TermDocMatrix(matrix, terms, doc_ids)
+        self.matrix._doc_norms = self.doc_norms
+        # the version stored at build time saves hashing the mapped arrays
+        self.matrix._version = self.meta.get('index_version')
+
+    def postings(self, term):
+        # document rows and tf*idf weights of one term, empty if the term isn't indexed
+        col = self.matrix.term_index.get(term)
+        if col is None:
+            return self.term_docs[:0], self.term_weights[:0]
+        start, end = self.term_indptr[col], self.term_indptr[col + 1]
+        return self.term_docs[start:end], self.term_weights[start:end]
+
+
+def loadBinaryIndex(dirname, mmap=True):
+    # open an index folder, see BinaryIndex
+    return BinaryIndex(dirname, mmap)
@@ -0,0 +1,72 @@
+import numpy as np
+from scipy import sparse
+from term_doc_matrix import buildQueryMatrix
+from binary_index import postingCounts
+
+# Okapi BM25 over the postings, as an alternative ranking to tf*idf cosine similarity
+#   score(q, d) = sum over query terms t in d of
+#                 idf(t) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(d) / avg len))
+#   idf(t) = ln(1 + (N - df + 0.5) / (df + 0.5))
+# the weight of every posting only depends on the term and document, so it is computed once from
+# the stored counts, document lengths and document frequencies and a batch of queries is then
+# one sparse matrix product like cosineScores
+
+
+class BM25Scorer:
+    def __init__(self, term_indptr, term_docs, term_counts, doc_lengths, terms, term_index=None, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.terms = terms
+        if term_index is None:
+            term_index = {term: i for i, term in enumerate(terms)}
+        self.term_index = term_index
+        term_indptr = np.asarray(term_indptr)
+        term_docs = np.asarray(term_docs)
+        doc_lengths = np.asarray(doc_lengths, dtype=np.float64)
+        num_docs = len(doc_lengths)
+
+        doc_freq = np.diff(term_indptr)
+        self.idf = np.log1p((num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        avg_length = doc_lengths.mean() if num_docs else 0.0
+        length_norm = k1 * (1 - b + b * doc_lengths / avg_length) if avg_length else np.full(num_docs, k1)
+
+        counts = np.asarray(term_counts, dtype=np.float64)
+        posting_terms = np.repeat(np.arange(len(doc_freq)), doc_freq)
+        weights = self.idf[posting_terms] * counts * (k1 + 1) / (counts + length_norm[term_docs])
+        # documents x terms, stored by term like the postings, float32 like the binary index weights
+        self.matrix = sparse.csc_matrix((weights.astype(np.float32), term_docs, term_indptr),
+                                        shape=(num_docs, len(doc_freq))).tocsr()
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    def columns(self, terms):
+        # same as TermDocMatrix.columns so buildQueryMatrix can be used with the scorer
+        return [self.term_index[term] for term in terms if term in self.term_index]
+
+
+def buildBM25(term_doc_matrix, inverted_index, pointer_index, k1=1.2, b=0.75):
+    # scorer from a TermDocMatrix and the inverted and pointer index holding the raw term counts
+    by_term = term_doc_matrix.matrix.tocsc()
+    by_term.sort_indices()
+    counts = postingCounts(term_doc_matrix, by_term, inverted_index, pointer_index)
+    doc_lengths = np.bincount(by_term.indices, weights=counts, minlength=term_doc_matrix.shape[0])
+    return BM25Scorer(by_term.indptr, by_term.indices, counts, doc_lengths, term_doc_matrix.terms,
+                      term_doc_matrix.term_index, k1, b)
+
+
+def bm25FromBinaryIndex(binary_index, k1=1.2, b=0.75):
+    # scorer straight from the stored postings counts and document lengths of a BinaryIndex
+    if not hasattr(binary_index, 'term_counts'):
+        raise ValueError('{} has no term counts, rebuild it with the inverted and pointer index'.format(
+            binary_index.dirname))
+    return BM25Scorer(binary_index.term_indptr, binary_index.term_docs, binary_index.term_counts,
+                      binary_index.doc_lengths, binary_index.matrix.terms, binary_index.matrix.term_index, k1, b)
+
+
+def bm25Scores(scorer, query_term_dict):
+    # bm25 score of every query against every document, queries x documents, a query term counts
+    # once however often it is repeated, a document matching no query term scores 0
+    query_matrix = buildQueryMatrix(query_term_dict, scorer)
+    return (query_matrix @ scorer.matrix.transpose()).toarray()
@@ -0,0 +1,140 @@
+import gzip
+import re
+
+# streaming readers for SMART style (.I/.T/.A/.B/.W, e.g. Cranfield, CACM, MED) and TREC style
+# (<DOC>/<DOCNO>/<TEXT>, topics in <top>) test collections, records are read one at a time so
+# collections far bigger than memory can be fed straight into analyzeDocuments
+# every record is a dictionary {'id': original id, 'num': position from 1, field: text, ...}
+
+trec_tag = re.compile(r'<(/?)([A-Za-z][\w-]*)[^>]*>')
+
+
+def openText(filename):
+    # text lines of a plain or gzipped file
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rt', encoding='utf-8', errors='replace')
+    return open(filename, 'r', encoding='utf-8', errors='replace')
+
+
+def readSmart(lines):
+    # SMART format, '.I id' starts a record and '.X' lines start field X of it
+    # a few Cranfield abstracts hold stray '.A' / '.B' / '.W' lines, a marker of a field the
+    # record already has is kept as text and a repeat of the field being read is skipped
+    record = None
+    field = None
+    text = []
+    num = 0
+    for line in lines:
+        if line[:2] == '.I' and (len(line) == 2 or line[2].isspace()):
+            if record is not None:
+                if field is not None:
+                    record[field] = ''.join(text)
+                yield record
+            num += 1
+            record = {'id': line[2:].strip(), 'num': num}
+            field = None
+        elif record is None:
+            continue
+        elif line[:1] == '.' and line[1:2].isalpha() and line[2:].strip() == '' and line[1] not in record:
+            if line[1] == field:
+                continue
+            if field is not None:
+                record[field] = ''.join(text)
+            field = line[1]
+            text = []
+        elif field is not None:
+            text.append(line)
+    if record is not None:
+        if field is not None:
+            record[field] = ''.join(text)
+        yield record
+
+
+def readTrec(lines, record_tags=('DOC', 'TOP')):
+    # TREC SGML, a record is everything between <DOC> and </DOC> (<top> and </top> for topics)
+    # a tag opens a field that runs until its closing tag or the next tag, field names are upper
+    # case tag names, the id is the DOCNO (or the topic number)
+    record = None
+    field = None
+    text = []
+    num = 0
+    for line in lines:
+        pos = 0
+        for match in trec_tag.finditer(line):
+            closing, tag = match.group(1), match.group(2).upper()
+            if field is not None:
+                text.append(line[pos:match.start()])
+            pos = match.end()
+            if tag in record_tags:
+                if closing:
+                    if record is not None:
+                        addTrecField(record, field, text)
+                        yield finishTrecRecord(record)
+                    record = None
+                else:
+                    num += 1
+                    record = {'num': num}
+                field = None
+                text = []
+            elif record is not None:
+                addTrecField(record, field, text)
+                field = None if closing else tag
+                text = []
+        if field is not None:
+            text.append(line[pos:])
+    if record is not None:
+        addTrecField(record, field, text)
+        yield finishTrecRecord(record)
+
+
+def addTrecField(record, field, text):
+    # repeated tags (several <TEXT> parts) are joined
+    if field is None:
+        return
+    value = ''.join(text)
+    record[field] = record[field] + value if field in record else value
+
+
+def finishTrecRecord(record):
+    if 'DOCNO' in record:
+        record['id'] = record['DOCNO'].strip()
+    elif 'NUM' in record:
+        record['id'] = record['NUM'].replace('Number:', '').strip()
+    else:
+        record['id'] = str(record['num'])
+    return record
+
+
+def readCollection(filename, collection_format=None):
+    # generator of the records of a collection file, the format is guessed from the first line
+    # that isn't blank unless given as 'smart' or 'trec'
+    with openText(filename) as txt_file:
+        if collection_format is None:
+            first = ''
+            for first in txt_file:
+                if first.strip():
+                    break
+            collection_format = 'trec' if first.lstrip().startswith('<') else 'smart'
+            txt_file.seek(0)
+        reader = readTrec if collection_format == 'trec' else readSmart
+        for record in reader(txt_file):
+            yield record
+
+
+def recordText(record, fields):
+    # text of the given fields of a record joined together, missing fields are skipped
+    return '\n'.join(record[field] for field in fields if field in record)
+
+
+def readQrels(filename):
+    # generator of (query id, doc id, relevance) from a relevance file, either the three column
+    # 'query doc grade' of Cranfield or the four column 'query iteration doc grade' of TREC
+    with openText(filename) as txt_file:
+        for line in txt_file:
+            tokenized = line.split()
+            if len(tokenized) >= 4:
+                yield tokenized[0], tokenized[2], int(tokenized[3])
+            elif len(tokenized) == 3:
+                yield tokenized[0], tokenized[1], int(tokenized[2])
+            elif len(tokenized) == 2:
+                yield tokenized[0], tokenized[1], 1
@@ -0,0 +1,54 @@
+import json
+import numpy as np
+from scipy.sparse.linalg import norm as sparse_norm
+
+
+def buildCooccurIndex(term_doc_matrix, k=10, terms=None, block_size=256):
+    # build a neighbour index holding only the top k co-occurring terms of each term
+    # the full vocabulary by vocabulary matrix is never held, rows are computed a block at a time
+    # pass terms to only compute the rows needed, e.g. the query vocabulary
+    term_array = term_doc_matrix.matrix
+    term_array_trans = term_array.transpose().tocsr()
+    # same scaling as getTermCoOccurMatrix so the stored values line up
+    scale = sparse_norm(term_array) ** 2
+
+    if terms is None:
+        term_locs = np.arange(len(term_doc_matrix.terms))
+    else:
+        term_locs = np.array(sorted(set(term_doc_matrix.columns(terms))), dtype=np.int64)
+
+    cooccur_index = {}
+    for start in range(0, len(term_locs), block_size):
+        block_locs = term_locs[start:start + block_size]
+        block = (term_array_trans[block_locs] @ term_array).tocsr()
+        for row, term_loc in enumerate(block_locs):
+            cols = block.indices[block.indptr[row]:block.indptr[row + 1]]
+            vals = block.data[block.indptr[row]:block.indptr[row + 1]]
+            if len(vals) > k:
+                top = np.argpartition(vals, -k)[-k:]
+                cols, vals = cols[top], vals[top]
+            order = np.argsort(-vals, kind='stable')
+            cooccur_index[term_doc_matrix.terms[term_loc]] = [
+                (term_doc_matrix.terms[cols[i]], float(vals[i] / scale)) for i in order if vals[i] > 0]
+    return cooccur_index
+
+
+def expandTermsFromIndex(cooccur_index, term_list, n=4):
+    # get the n closest terms (including the term itself) for each term in the list
+    extra_terms = []
+    for term in term_list:
+        extra_terms.extend(neighbour for neighbour, _ in cooccur_index.get(term, [])[:n])
+    return extra_terms
+
+
+def saveCooccurIndex(cooccur_index, filename):
+    # write the neighbour index next to the inverted index json files
+    with open(filename, 'w') as json_file:
+        json.dump(cooccur_index, json_file)
+
+
+def loadCooccurIndex(filename):
+    # read a neighbour index written by saveCooccurIndex
+    with open(filename, 'r') as json_file:
+        cooccur_index = json.load(json_file)
+    return {term: [tuple(pair) for pair in neighbours] for term, neighbours in cooccur_index.items()}
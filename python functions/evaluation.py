@@ -0,0 +1,148 @@
+import json
+import numpy as np
+from scipy import sparse
+
+# precision / recall style measures for every query at once from a query x document score matrix
+# relevance judgements are a sparse binary query x document matrix lined up with the score rows
+
+
+def qrelsMatrix(query_relevance, query_names, doc_ids, doc_offset=1):
+    # sparse query x document matrix with a 1 where the document is relevant to the query
+    # query_relevance is {query name: [relevant doc numbers]}, Cranfield doc numbers start at 1
+    # while the index numbers documents from 0, doc_offset is taken off to find the document row
+    doc_index = {str(doc_id): i for i, doc_id in enumerate(doc_ids)}
+    rows = []
+    cols = []
+    for row, name in enumerate(query_names):
+        relevant = query_relevance.get(name, query_relevance.get(str(name), []))
+        for doc_num in set(relevant):
+            col = doc_index.get(str(int(doc_num) - doc_offset))
+            if col is not None:
+                rows.append(row)
+                cols.append(col)
+    return sparse.csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), shape=(len(query_names), len(doc_ids)))
+
+
+def loadQrels(filename, query_names, doc_ids, doc_offset=1):
+    # qrelsMatrix from a relevance json such as cranfield_query_rel.json
+    with open(filename, 'r') as json_file:
+        return qrelsMatrix(json.load(json_file), query_names, doc_ids, doc_offset)
+
+
+def scoreMatrix(query_results, query_names, num_docs):
+    # stack {query name: scores over all documents} into a dense matrix in query_names order,
+    # queries with no results get a row of 0 and NaN scores (empty documents) become 0
+    scores = np.zeros((len(query_names), num_docs))
+    for row, name in enumerate(query_names):
+        if name in query_results:
+            scores[row] = np.nan_to_num(np.asarray(query_results[name], dtype=np.float64))
+    return scores
+
+
+def setCounts(retrieved, qrels):
+    # true positive, false positive and false negative counts of each query for a retrieved set,
+    # retrieved is a boolean (dense or sparse) query x document matrix
+    retrieved = sparse.csr_matrix(retrieved, dtype=bool)
+    tp = np.asarray(retrieved.multiply(qrels).sum(axis=1)).ravel()
+    fp = np.asarray(retrieved.sum(axis=1)).ravel() - tp
+    fn = np.asarray(qrels.sum(axis=1)).ravel() - tp
+    return tp, fp, fn
+
+
+def ratio(num, den):
+    # num / den with 0 where den is 0
+    num = np.asarray(num, dtype=np.float64)
+    den = np.asarray(den, dtype=np.float64)
+    return np.divide(num, den, out=np.zeros(np.broadcast(num, den).shape), where=den > 0)
+
+
+def setPrecisionRecall(scores, qrels, threshold):
+    # precision and recall of every document scoring over threshold, as outputPrecisionResultsForTest
+    # gives (precision per query, recall per query, overall precision, overall recall)
+    tp, fp, fn = setCounts(scores > threshold, qrels)
+    return ratio(tp, tp + fp), ratio(tp, tp + fn), float(ratio(tp.sum(), tp.sum() + fp.sum())), \
+        float(ratio(tp.sum(), tp.sum() + fn.sum()))
+
+
+def thresholdSweep(scores, qrels, thresholds):
+    # overall precision, recall and f1 at every threshold from one sort of all the scores
+    # instead of re-running the threshold cut for each one
+    flat_scores = scores.ravel()
+    order = np.argsort(-flat_scores, kind='stable')
+    sorted_scores = flat_scores[order]
+    hits = np.cumsum(qrels.toarray().ravel()[order])
+    num_relevant = qrels.nnz
+
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    # number of scores strictly over each threshold, sorted_scores is descending
+    num_retrieved = np.searchsorted(-sorted_scores, -thresholds, side='left')
+    tp = np.where(num_retrieved > 0, hits[np.maximum(num_retrieved - 1, 0)], 0)
+    precision = ratio(tp, num_retrieved)
+    recall = ratio(tp, num_relevant)
+    f1 = ratio(2 * precision * recall, precision + recall)
+    return {'thresholds': thresholds, 'precision': precision, 'recall': recall, 'f1': f1}
+
+
+def bestThreshold(scores, qrels, thresholds=None, measure='f1'):
+    # threshold with the best overall measure of a sweep, defaults to every 0.01 from 0 to 1
+    if thresholds is None:
+        thresholds = np.round(np.arange(0, 1, .01), 2)
+    sweep = thresholdSweep(scores, qrels, thresholds)
+    best = int(np.argmax(sweep[measure]))
+    return float(sweep['thresholds'][best]), {key: float(val[best]) for key, val in sweep.items()}
+
+
+def rankedRelevance(scores, qrels, depth=None):
+    # relevance of each query's documents in ranked order, best first, cut at depth
+    # documents scoring 0 or less aren't retrieved and never count as a hit
+    depth = scores.shape[1] if depth is None else min(depth, scores.shape[1])
+    if depth < scores.shape[1]:
+        top = np.argpartition(-scores, depth - 1, axis=1)[:, :depth]
+        order = np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1,
+                                                   kind='stable'), axis=1)
+    else:
+        order = np.argsort(-scores, axis=1, kind='stable')
+    return np.take_along_axis(qrels.toarray(), order, axis=1) & (np.take_along_axis(scores, order, axis=1) > 0)
+
+
+def precisionAtK(scores, qrels, k=10):
+    # fraction of the k best documents of each query that are relevant
+    return rankedRelevance(scores, qrels, k).sum(axis=1) / k
+
+
+def recallAtK(scores, qrels, k=10):
+    # fraction of each query's relevant documents in its k best
+    return ratio(rankedRelevance(scores, qrels, k).sum(axis=1), np.asarray(qrels.sum(axis=1)).ravel())
+
+
+def averagePrecision(scores, qrels, depth=None):
+    # average of the precision at the rank of each relevant document, per query
+    # relevant documents never retrieved add a precision of 0
+    ranked = rankedRelevance(scores, qrels, depth)
+    precision_at_rank = np.cumsum(ranked, axis=1) / np.arange(1, ranked.shape[1] + 1)
+    return ratio((precision_at_rank * ranked).sum(axis=1), np.asarray(qrels.sum(axis=1)).ravel())
+
+
+def ndcg(scores, qrels, k=None):
+    # normalized discounted cumulative gain with binary gains, per query, over the k best documents
+    ranked = rankedRelevance(scores, qrels, k)
+    discounts = 1 / np.log2(np.arange(2, ranked.shape[1] + 2))
+    dcg = (ranked * discounts).sum(axis=1)
+    num_relevant = np.minimum(np.asarray(qrels.sum(axis=1)).ravel(), ranked.shape[1])
+    ideal = np.concatenate([[0], np.cumsum(discounts)])[num_relevant]
+    return ratio(dcg, ideal)
+
+
+def evaluate(scores, qrels, k_values=(5, 10), threshold=None):
+    # mean of each measure over the queries that have relevance judgements
+    judged = np.asarray(qrels.sum(axis=1)).ravel() > 0
+    results = {'queries': int(judged.sum()),
+               'map': float(averagePrecision(scores, qrels)[judged].mean()),
+               'ndcg': float(ndcg(scores, qrels)[judged].mean())}
+    for k in k_values:
+        results['p@{}'.format(k)] = float(precisionAtK(scores, qrels, k)[judged].mean())
+        results['r@{}'.format(k)] = float(recallAtK(scores, qrels, k)[judged].mean())
+        results['ndcg@{}'.format(k)] = float(ndcg(scores, qrels, k)[judged].mean())
+    if threshold is not None:
+        _, _, results['precision'], results['recall'] = setPrecisionRecall(scores, qrels, threshold)
+    return results
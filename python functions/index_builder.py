@@ -0,0 +1,95 @@
+from collections import Counter, deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import math
+from text_analysis import analyzeText, stem_cache
+
+
+def countChunkTerms(chunk):
+    # analyze and count the terms of a chunk of (document key, text) pairs
+    return [(doc_key, Counter(analyzeText(text))) for doc_key, text in chunk]
+
+
+def countChunkTermsInWorker(chunk):
+    # same as countChunkTerms, but also hands back the stem cache lookups and the newly
+    # stemmed words so the parent's cache ends up the same as after a serial run
+    hits, misses = stem_cache.hits, stem_cache.misses
+    stem_cache.learned = {}
+    doc_term_counts = countChunkTerms(chunk)
+    learned, stem_cache.learned = stem_cache.learned, None
+    return doc_term_counts, stem_cache.hits - hits, stem_cache.misses - misses, learned
+
+
+def analyzeDocuments(docs, workers=1, chunk_size=100):
+    # count the analyzed terms of each (document key, text) pair across a pool of processes
+    # docs can be a generator, only a few chunks per worker are read ahead at a time
+    # chunks come back in order so the merged index is the same as the serial one
+    # workers are forked, where fork isn't available (windows) the documents are done serially
+    if workers == 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        return countChunkTerms(docs)
+    docs = iter(docs)
+    doc_term_counts = []
+    pending = deque()
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as executor:
+        while True:
+            chunk = list(islice(docs, chunk_size))
+            if chunk:
+                pending.append(executor.submit(countChunkTermsInWorker, chunk))
+            if pending and (not chunk or len(pending) >= 2 * workers):
+                chunk_counts, hits, misses, learned = pending.popleft().result()
+                doc_term_counts.extend(chunk_counts)
+                stem_cache.hits += hits
+                stem_cache.misses += misses
+                for word, stemmed_word in learned.items():
+                    stem_cache.add(word, stemmed_word)
+            if not chunk and not pending:
+                return doc_term_counts
+
+
+def countDocumentTerms(doc_terms):
+    # count term frequencies for each document in a single pass
+    # doc_terms is an iterable of (document key, list of stemmed terms)
+    return [(doc_key, Counter(terms)) for doc_key, terms in doc_terms]
+
+
+def mergePostings(inverted_index, pointer_index, doc_term_counts):
+    # add the counted terms of new documents to the inverted index and pointer index
+    # terms get integer ids in order of first appearance, after any id already in use,
+    # so the same corpus always gets the same ids and older ids never change
+    next_id = max(pointer_index, default=-1) + 1
+    for doc_key, term_counts in doc_term_counts:
+        for term, count in term_counts.items():
+            entry = inverted_index.get(term)
+            if entry is None:
+                entry = inverted_index[term] = {'freq': 0, 'id': next_id}
+                pointer_index[next_id] = {}
+                next_id += 1
+            entry['freq'] += count
+            pointer_index[entry['id']][doc_key] = count
+    return inverted_index, pointer_index
+
+
+def computeIdf(inverted_index, pointer_index, n):
+    # idf of each term given n documents in the collection
+    return {term: math.log2(n / len(pointer_index[entry['id']])) for term, entry in inverted_index.items()}
+
+
+def computeTfIdf(inverted_index, pointer_index, term_idf_dict, doc_keys):
+    # create a tf_idf dictionary keyed on the document key, every document gets an entry
+    document_tf_idf_dict = {doc_key: {} for doc_key in doc_keys}
+    for term, entry in inverted_index.items():
+        idf = term_idf_dict[term]
+        for doc_key, count in pointer_index[entry['id']].items():
+            document_tf_idf_dict[doc_key][term] = (idf * count)
+    return document_tf_idf_dict
+
+
+def buildIndexes(doc_term_counts):
+    # build the inverted index, pointer index and tf*idf dictionary from scratch
+    # doc_term_counts comes from countDocumentTerms or analyzeDocuments
+    inverted_index, pointer_index = mergePostings({}, {}, doc_term_counts)
+    doc_keys = [doc_key for doc_key, _ in doc_term_counts]
+    term_idf_dict = computeIdf(inverted_index, pointer_index, len(doc_keys))
+    document_tf_idf_dict = computeTfIdf(inverted_index, pointer_index, term_idf_dict, doc_keys)
+    return inverted_index, pointer_index, document_tf_idf_dict
@@ -0,0 +1,142 @@
+from contextlib import contextmanager
+from functools import wraps
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# stage timers, counters and memory high water marks for the retrieval pipeline
+# everything is off until configured, a disabled stage or count is a single attribute check
+# config is a json file such as
+#   {"enabled": true, "trace_memory": false, "json_file": "instrumentation_report.json",
+#    "prometheus_file": "instrumentation_report.prom", "profile_file": "query.prof"}
+
+
+class Instrumentation:
+    def __init__(self, enabled=False, trace_memory=False, json_file=None, prometheus_file=None, profile_file=None):
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.json_file = json_file
+        self.prometheus_file = prometheus_file
+        self.profile_file = profile_file
+        self.stages = {}
+        self.counters = {}
+
+    def configure(self, config):
+        # settings from a dictionary or a json file name, a file that isn't there leaves them as they are
+        if isinstance(config, str):
+            if not os.path.exists(config):
+                return
+            with open(config, 'r') as json_file:
+                config = json.load(json_file)
+        for name in ('enabled', 'trace_memory', 'json_file', 'prometheus_file', 'profile_file'):
+            if name in config:
+                setattr(self, name, config[name])
+
+    def reset(self):
+        self.stages = {}
+        self.counters = {}
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def stage(self, name):
+        # time a block, nested stages are timed too and each keeps its own total
+        # with trace_memory the peak of python allocations during the outermost stage is kept
+        if not self.enabled:
+            yield
+            return
+        tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stage = self.stages.setdefault(name, {'calls': 0, 'total_sec': 0.0, 'max_sec': 0.0})
+            stage['calls'] += 1
+            stage['total_sec'] += elapsed
+            stage['max_sec'] = max(stage['max_sec'], elapsed)
+            if tracing:
+                peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                tracemalloc.stop()
+                stage['peak_memory_mb'] = max(stage.get('peak_memory_mb', 0.0), peak_mb)
+
+    def timed(self, name=None):
+        # decorator form of stage, named after the function unless given a name
+        def decorator(func):
+            stage_name = name or func.__name__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.stage(stage_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def report(self):
+        report = {'stages': self.stages, 'counters': self.counters}
+        if resource is not None:
+            # high water mark of the whole process, kilobytes on linux
+            report['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return report
+
+    def prometheusText(self):
+        # the report in the prometheus text exposition format, one group of lines per metric
+        families = [('retrieval_stage_seconds_total', 'counter', 'total_sec'),
+                    ('retrieval_stage_calls_total', 'counter', 'calls'),
+                    ('retrieval_stage_seconds_max', 'gauge', 'max_sec'),
+                    ('retrieval_stage_peak_memory_megabytes', 'gauge', 'peak_memory_mb')]
+        lines = []
+        for metric, metric_type, key in families:
+            samples = [(name, stage[key]) for name, stage in sorted(self.stages.items()) if key in stage]
+            if samples:
+                lines.append('# TYPE {} {}'.format(metric, metric_type))
+                lines.extend('{}{{stage="{}"}} {}'.format(metric, name, value) for name, value in samples)
+        if self.counters:
+            lines.append('# TYPE retrieval_events_total counter')
+            lines.extend('retrieval_events_total{{event="{}"}} {}'.format(name, value)
+                         for name, value in sorted(self.counters.items()))
+        report = self.report()
+        if 'max_rss_mb' in report:
+            lines.append('# TYPE retrieval_max_rss_megabytes gauge')
+            lines.append('retrieval_max_rss_megabytes {}'.format(report['max_rss_mb']))
+        return '\n'.join(lines) + '\n'
+
+    def export(self, json_file=None, prometheus_file=None):
+        # write the report to the configured json and / or prometheus text files
+        json_file = json_file or self.json_file
+        prometheus_file = prometheus_file or self.prometheus_file
+        if json_file:
+            with open(json_file, 'w') as out_file:
+                json.dump(self.report(), out_file, indent=2)
+        if prometheus_file:
+            with open(prometheus_file, 'w') as out_file:
+                out_file.write(self.prometheusText())
+
+    def profile(self, func, *args, sort='cumulative', limit=25, **kwargs):
+        # run func once under cProfile, e.g. a single query, gives (result, top of the stats as text)
+        # the raw stats go to profile_file when it is set, for snakeviz or pstats
+        profiler = cProfile.Profile()
+        result = profiler.runcall(func, *args, **kwargs)
+        if self.profile_file:
+            profiler.dump_stats(self.profile_file)
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats(sort).print_stats(limit)
+        return result, text.getvalue()
+
+
+# shared by the library modules and the notebook functions, off until configured
+instruments = Instrumentation()
@@ -0,0 +1,83 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+from scipy import sparse
+from term_doc_matrix import buildQueryMatrix
+from scoring import cosineScores
+
+# matrix shared with forked worker processes, set just before the pool is made
+shared_term_doc_matrix = None
+
+
+def feedbackRows(term_doc_matrix, query_term_dict):
+    # rows of the documents each unexpanded query matches at all, scored in one batch
+    scores = cosineScores(buildQueryMatrix(query_term_dict, term_doc_matrix), term_doc_matrix.matrix,
+                          term_doc_matrix.doc_norms)
+    return [np.flatnonzero(np.nan_to_num(row) > 0) for row in scores]
+
+
+def localExpansionTerms(term_doc_matrix, rows, query_terms, n=4):
+    # expand a query with the n terms that co-occur most with each query term, only counting
+    # the feedback documents, co-occurrence rows are only computed for the query terms
+    # (term x feedback docs x vocabulary) instead of the whole vocabulary x vocabulary matrix
+    expanded_terms = set(query_terms)
+    cols = sorted(set(term_doc_matrix.columns(query_terms)))
+    if not cols or not len(rows):
+        return list(expanded_terms)
+    # only the query term columns are taken out, masked to the feedback documents, the product
+    # then reads the feedback rows of the shared csr matrix in place instead of copying them
+    matrix = term_doc_matrix.matrix
+    in_feedback = np.zeros(matrix.shape[0])
+    in_feedback[rows] = 1
+    query_cols = sparse.diags(in_feedback) @ matrix[:, cols]
+    query_cols.eliminate_zeros()
+    cooccur = (query_cols.transpose().tocsr() @ matrix).tocsr()
+    cooccur.sort_indices()
+    for i in range(len(cols)):
+        neighbours = cooccur.indices[cooccur.indptr[i]:cooccur.indptr[i + 1]]
+        vals = cooccur.data[cooccur.indptr[i]:cooccur.indptr[i + 1]]
+        if len(vals) > n:
+            neighbours = neighbours[np.argpartition(vals, -n)[-n:]]
+        expanded_terms.update(term_doc_matrix.terms[col] for col in neighbours)
+    return list(expanded_terms)
+
+
+def expandChunk(chunk):
+    # worker: expand a chunk of (feedback rows, query terms, n) with the shared matrix
+    return [localExpansionTerms(shared_term_doc_matrix, rows, query_terms, n) for rows, query_terms, n in chunk]
+
+
+def localExpandAndQuery(term_doc_matrix, query_term_dict, n=4, workers=1, chunk_size=16):
+    # local analysis (pseudo relevance feedback) for every query in one batch
+    # 1. one batched query of the unexpanded queries gives each query's feedback documents
+    # 2. each query is expanded with the terms that co-occur with it in its feedback documents,
+    #    optionally across forked worker processes
+    # 3. all expanded queries are scored in one matrix product, each only over its feedback
+    #    documents, scores for the other documents are 0
+    # gives {query name: list of scores over all documents}, queries with no results are left out
+    names = list(query_term_dict)
+    all_rows = feedbackRows(term_doc_matrix, query_term_dict)
+    jobs = [(rows, query_term_dict[name], n) for name, rows in zip(names, all_rows)]
+
+    global shared_term_doc_matrix
+    shared_term_doc_matrix = term_doc_matrix
+    if workers == 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        expanded = expandChunk(jobs)
+    else:
+        chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as executor:
+            expanded = [terms for chunk in executor.map(expandChunk, chunks) for terms in chunk]
+    shared_term_doc_matrix = None
+
+    expanded_query_term_dict = dict(zip(names, expanded))
+    scores = cosineScores(buildQueryMatrix(expanded_query_term_dict, term_doc_matrix), term_doc_matrix.matrix,
+                          term_doc_matrix.doc_norms)
+
+    # keep each query's scores only over its own feedback documents
+    local_query_results = {}
+    for i, (name, rows) in enumerate(zip(names, all_rows)):
+        local_scores = np.zeros(len(term_doc_matrix))
+        local_scores[rows] = np.nan_to_num(scores[i, rows])
+        if (local_scores > 0).any():
+            local_query_results[name] = list(local_scores)
+    return local_query_results
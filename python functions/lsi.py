@@ -0,0 +1,107 @@
+import json
+import os
+import numpy as np
+from scipy import sparse
+from term_doc_matrix import buildQueryMatrix
+
+# latent semantic indexing, the tf*idf matrix is factorized once with a randomized truncated svd
+# (A ~ U S V^T, documents as rows) and documents are kept as rank-dimensional vectors U S,
+# queries are folded in with q V and scored against the document vectors by cosine similarity,
+# terms that occur in the same documents end up close so a query matches documents holding
+# related terms without any expansion step
+
+
+def randomizedSvd(matrix, rank, oversample=10, power_iters=4, seed=0):
+    # truncated svd of a sparse matrix by random projection (Halko, Martinsson, Tropp 2011)
+    # gives (U, s, Vt) of the rank largest singular values
+    rng = np.random.default_rng(seed)
+    num_rows, num_cols = matrix.shape
+    size = min(rank + oversample, num_rows, num_cols)
+    basis = matrix @ rng.standard_normal((num_cols, size))
+    basis, _ = np.linalg.qr(basis)
+    # power iterations sharpen the spectrum, re-orthonormalized each time to keep precision
+    for _ in range(power_iters):
+        basis, _ = np.linalg.qr(matrix.transpose() @ basis)
+        basis, _ = np.linalg.qr(matrix @ basis)
+    small = (matrix.transpose() @ basis).transpose()
+    u_small, s, vt = np.linalg.svd(small, full_matrices=False)
+    rank = min(rank, len(s))
+    return (basis @ u_small)[:, :rank], s[:rank], vt[:rank]
+
+
+class LatentIndex:
+    # document vectors (unit length, float32) and the term projection of a truncated svd
+    def __init__(self, doc_vectors, projection, singular_values, terms, doc_ids, index_version=None):
+        self.doc_vectors = doc_vectors
+        self.projection = projection
+        self.singular_values = singular_values
+        self.terms = terms
+        self.term_index = {term: i for i, term in enumerate(terms)}
+        self.doc_ids = doc_ids
+        self.index_version = index_version
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    @property
+    def rank(self):
+        return self.doc_vectors.shape[1]
+
+    def columns(self, terms):
+        # same as TermDocMatrix.columns so buildQueryMatrix can be used with a latent index
+        return [self.term_index[term] for term in terms if term in self.term_index]
+
+    @property
+    def shape(self):
+        return len(self.doc_ids), len(self.terms)
+
+
+def buildLatentIndex(term_doc_matrix, rank=200, seed=0):
+    # factorize the tf*idf matrix of a TermDocMatrix into a LatentIndex of the given rank
+    matrix = sparse.csr_matrix(term_doc_matrix.matrix, dtype=np.float64)
+    u, s, vt = randomizedSvd(matrix, rank, seed=seed)
+    doc_vectors = u * s
+    with np.errstate(divide='ignore', invalid='ignore'):
+        doc_vectors = np.nan_to_num(doc_vectors / np.linalg.norm(doc_vectors, axis=1, keepdims=True))
+    return LatentIndex(doc_vectors.astype(np.float32), vt.transpose().astype(np.float32), s.astype(np.float32),
+                       list(term_doc_matrix.terms), list(term_doc_matrix.doc_ids), term_doc_matrix.version)
+
+
+def latentScores(latent_index, query_term_dict):
+    # cosine scores of every query against every document in the latent space, queries x documents,
+    # a query with no indexed terms scores nan like cosineScores
+    query_vectors = buildQueryMatrix(query_term_dict, latent_index) @ latent_index.projection
+    query_norms = np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        query_vectors = query_vectors / query_norms
+    return np.asarray(query_vectors, dtype=np.float32) @ latent_index.doc_vectors.transpose()
+
+
+def saveLatentIndex(dirname, latent_index):
+    # numpy arrays in a folder next to the binary index, the index version ties it to the tf*idf
+    # it was built from
+    os.makedirs(dirname, exist_ok=True)
+    np.save(os.path.join(dirname, 'doc_vectors.npy'), latent_index.doc_vectors)
+    np.save(os.path.join(dirname, 'projection.npy'), latent_index.projection)
+    np.save(os.path.join(dirname, 'singular_values.npy'), latent_index.singular_values)
+    with open(os.path.join(dirname, 'terms.txt'), 'w', encoding='utf-8') as txt_file:
+        txt_file.write('\n'.join(latent_index.terms))
+    with open(os.path.join(dirname, 'doc_ids.txt'), 'w', encoding='utf-8') as txt_file:
+        txt_file.write('\n'.join(str(doc_id) for doc_id in latent_index.doc_ids))
+    with open(os.path.join(dirname, 'meta.json'), 'w') as json_file:
+        json.dump({'rank': latent_index.rank, 'num_docs': len(latent_index.doc_ids),
+                   'num_terms': len(latent_index.terms), 'index_version': latent_index.index_version}, json_file)
+
+
+def loadLatentIndex(dirname, mmap=True):
+    # open a folder written by saveLatentIndex, the vectors are memory mapped by default
+    mmap_mode = 'r' if mmap else None
+    with open(os.path.join(dirname, 'meta.json'), 'r') as json_file:
+        meta = json.load(json_file)
+    with open(os.path.join(dirname, 'terms.txt'), 'r', encoding='utf-8') as txt_file:
+        terms = txt_file.read().split('\n') if meta['num_terms'] else []
+    with open(os.path.join(dirname, 'doc_ids.txt'), 'r', encoding='utf-8') as txt_file:
+        doc_ids = txt_file.read().split('\n') if meta['num_docs'] else []
+    return LatentIndex(np.load(os.path.join(dirname, 'doc_vectors.npy'), mmap_mode=mmap_mode),
+                       np.load(os.path.join(dirname, 'projection.npy'), mmap_mode=mmap_mode),
+                       np.load(os.path.join(dirname, 'singular_values.npy')), terms, doc_ids, meta['index_version'])
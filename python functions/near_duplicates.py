@@ -0,0 +1,170 @@
+import json
+import os
+import re
+import zlib
+import numpy as np
+
+# MinHash signatures of word shingles with locality sensitive hashing (banding) to find
+# articles that are near copies of one already seen, e.g. the same wire story on many sites
+
+# prime just over 2**32, shingle hashes are crc32 so every hash is below it
+hash_prime = 4294967311
+# signature value of a text with no words, above every real hash so it never matches one
+no_signature = np.iinfo(np.uint64).max
+word = re.compile(r'[a-z0-9]+')
+
+
+def shingleHashes(text, size=5):
+    # crc32 of every run of size words, texts shorter than size words are one shingle
+    words = word.findall(text.lower())
+    if not words:
+        return np.array([], dtype=np.uint64)
+    if len(words) < size:
+        return np.array([zlib.crc32(' '.join(words).encode('utf-8'))], dtype=np.uint64)
+    shingles = {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles), dtype=np.uint64,
+                       count=len(shingles))
+
+
+class NearDuplicateIndex:
+    # signatures of every article seen, keyed on url, with the articles found to be near
+    # duplicates mapped to the first article of their cluster
+    # bands x rows = num_perm, two articles with shingle jaccard similarity s share a band with
+    # probability 1 - (1 - s**rows)**bands, candidates are kept if their estimated similarity
+    # is at least threshold
+    def __init__(self, num_perm=128, bands=16, threshold=0.8, shingle_size=5, seed=1, filename=None):
+        if num_perm % bands:
+            raise ValueError('num_perm {} is not a multiple of bands {}'.format(num_perm, bands))
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.filename = filename
+        # a < 2**31 and x < 2**32 keep a * x + b below 2**64
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 31, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 31, num_perm, dtype=np.uint64)
+
+        self.keys = []
+        self.key_index = {}
+        self.signatures = np.zeros((0, num_perm), dtype=np.uint64)
+        self.pending = []
+        self.buckets = {}
+        self.duplicate_of = {}
+        if filename is not None:
+            self.load(filename)
+
+    def __contains__(self, key):
+        return key in self.key_index
+
+    def __len__(self):
+        return len(self.keys)
+
+    def signature(self, text):
+        # minimum of num_perm random hash functions over the shingles, None if the text has no words
+        hashes = shingleHashes(text, self.shingle_size)
+        if not len(hashes):
+            return None
+        return ((self.a[:, None] * hashes[None, :] + self.b[:, None]) % np.uint64(hash_prime)).min(axis=1)
+
+    def bandKeys(self, signature):
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def signatureRow(self, i):
+        if i < len(self.signatures):
+            return self.signatures[i]
+        return self.pending[i - len(self.signatures)]
+
+    def query(self, signature):
+        # key of the most similar article indexed so far if it is a near duplicate, else None
+        candidates = {i for band_key in self.bandKeys(signature) for i in self.buckets.get(band_key, ())}
+        best_key = None
+        best_similarity = self.threshold
+        for i in sorted(candidates):
+            similarity = float(np.mean(self.signatureRow(i) == signature))
+            if similarity >= best_similarity:
+                best_key, best_similarity = self.keys[i], similarity
+        return best_key
+
+    def add(self, key, text):
+        # hash a new article, gives the key of the article it duplicates or None if it's new
+        # only the first article of a cluster goes in the lsh buckets
+        if key in self.key_index:
+            return self.duplicate_of.get(key)
+        signature = self.signature(text)
+        if signature is None:
+            # nothing to compare, the key is still kept so the text isn't hashed again next run
+            self.key_index[key] = len(self.keys)
+            self.keys.append(key)
+            self.pending.append(np.full(self.num_perm, no_signature, dtype=np.uint64))
+            return None
+        original = self.query(signature)
+        if original is not None:
+            original = self.duplicate_of.get(original, original)
+            self.duplicate_of[key] = original
+        self.key_index[key] = len(self.keys)
+        self.keys.append(key)
+        self.pending.append(signature)
+        if original is None:
+            for band_key in self.bandKeys(signature):
+                self.buckets.setdefault(band_key, []).append(self.key_index[key])
+        return original
+
+    def clusters(self):
+        # {first article: [its near duplicates]}
+        clusters = {}
+        for key, original in self.duplicate_of.items():
+            clusters.setdefault(original, []).append(key)
+        return clusters
+
+    def stats(self):
+        return {'articles': len(self.keys), 'duplicates': len(self.duplicate_of),
+                'clusters': len(set(self.duplicate_of.values()))}
+
+    def flush(self):
+        # move the signatures added since the last flush into the signature matrix
+        if self.pending:
+            self.signatures = np.vstack([self.signatures, np.array(self.pending, dtype=np.uint64)])
+            self.pending = []
+
+    def save(self, filename=None):
+        # keys and duplicate map go in json strings, signatures in one matrix of a numpy archive
+        filename = filename or self.filename
+        self.flush()
+        settings = {'num_perm': self.num_perm, 'bands': self.bands, 'threshold': self.threshold,
+                    'shingle_size': self.shingle_size, 'seed': self.seed}
+        np.savez(filename, settings=np.array(json.dumps(settings)), keys=np.array(json.dumps(self.keys)),
+                 duplicate_of=np.array(json.dumps(self.duplicate_of)), signatures=self.signatures)
+
+    def load(self, filename):
+        # read signatures written by save, does nothing if the file isn't there yet
+        # the lsh buckets aren't stored, they are rebuilt from the signatures
+        if not os.path.exists(filename):
+            return
+        with np.load(filename) as archive:
+            settings = json.loads(str(archive['settings']))
+            mine = {'num_perm': self.num_perm, 'bands': self.bands, 'shingle_size': self.shingle_size,
+                    'seed': self.seed}
+            if any(settings[name] != value for name, value in mine.items()):
+                raise ValueError('{} was made with {}, delete it to rehash with {}'.format(filename, settings, mine))
+            self.keys = json.loads(str(archive['keys']))
+            self.duplicate_of = json.loads(str(archive['duplicate_of']))
+            self.signatures = archive['signatures']
+        self.key_index = {key: i for i, key in enumerate(self.keys)}
+        self.pending = []
+        self.buckets = {}
+        for i, key in enumerate(self.keys):
+            if key not in self.duplicate_of and self.signatures[i, 0] != no_signature:
+                for band_key in self.bandKeys(self.signatures[i]):
+                    self.buckets.setdefault(band_key, []).append(i)
+
+
+def filterNearDuplicates(duplicate_index, articles):
+    # generator of the (url, text) articles that aren't near duplicates of an article seen before,
+    # every article is added to the index, articles already hashed in an earlier run are
+    # passed through unless they were found to be duplicates then
+    for url, text in articles:
+        if duplicate_index.add(url, text) is None:
+            yield url, text
@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import newspaper
+from newspaper import Article
+
+
+class HostRateLimiter:
+    # spaces out requests to the same host by at least min_interval seconds,
+    # requests to different hosts don't wait on each other
+    def __init__(self, min_interval=1.0):
+        self.min_interval = min_interval
+        self.next_time = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time.get(host, now))
+            self.next_time[host] = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def makeSession(pool_size=16, retries=3):
+    # one http session shared by all fetch threads, keeps connections open per host
+    # and retries connection errors and 429 / 5xx responses with backoff
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=['GET'])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = 'Mozilla/5.0 (compatible; newsapi-article-fetch)'
+    return session
+
+
+def fetchArticle(url, session, rate_limiter, timeout=10):
+    # download one url and let 'newspaper' parse it, gives back title + text or None if it failed
+    rate_limiter.wait(url)
+    try:
+        response = session.get(url, timeout=timeout)
+        response.raise_for_status()
+        article = Article(url)
+        article.download(input_html=response.text)
+        article.parse()
+    except (requests.RequestException, newspaper.article.ArticleException):
+        return None
+    return article.title + ' ' + article.text
+
+
+def fetchArticles(urls, max_workers=16, per_host_interval=1.0, timeout=10, retries=3):
+    # download and parse urls across a pool of threads, at most max_workers at once
+    # returns a dictionary of url to article text for the urls that worked, in url order
+    session = makeSession(max_workers, retries)
+    rate_limiter = HostRateLimiter(per_host_interval)
+    urls = list(urls)
+    with ThreadPoolExecutor(max_workers) as executor:
+        texts = executor.map(lambda url: fetchArticle(url, session, rate_limiter, timeout), urls)
+        articles = {url: text for url, text in zip(urls, texts) if text is not None}
+    session.close()
+    return articles
+
+
+def fetchDailyArticles(news_api, sources, dates, max_workers=8):
+    # run the news api get_everything request for each date at the same time,
+    # the article lists come back in the same order as the dates
+    def dailyRequest(date):
+        return news_api.get_everything(sources=sources, language='en', from_param=str(date), to=str(date),
+                                       page_size=100, page=1)['articles']
+
+    with ThreadPoolExecutor(max_workers) as executor:
+        return list(executor.map(dailyRequest, dates))
@@ -0,0 +1,62 @@
+import numpy as np
+from text_analysis import analyzeText
+from term_doc_matrix import buildQueryMatrix
+from scoring import cosineScores, topKDocuments
+from cooccurrence import expandTermsFromIndex
+from article_dates import no_date, dayNumber
+
+# portfolio days are {date: [{'Name', 'Symbol'}, ...]} as kept in the portfolio store, a company
+# moving on several days is analyzed and scored once, and each day's movers are only matched
+# with articles published within a window of days around that day
+
+
+def portfolioQueries(portfolio_dict):
+    # unique companies over all days with their stemmed name terms and ticker, and the
+    # companies moving on each day, gives ({company: terms}, {date: [companies]})
+    query_term_dict = {}
+    day_companies = {}
+    for day, stocks in portfolio_dict.items():
+        day_companies[day] = []
+        for stock in stocks:
+            name = stock['Name'].lower()
+            if name not in query_term_dict:
+                query_term_dict[name] = analyzeText(name) + [stock['Symbol'].lower()]
+            if name not in day_companies[day]:
+                day_companies[day].append(name)
+    return query_term_dict, day_companies
+
+
+def dateWindow(doc_days, day, days_before=3, days_after=1, include_undated=True):
+    # boolean mask of the documents published from days_before days before day to days_after after
+    # articles with no known publish date are in every window unless include_undated is False
+    day = dayNumber(day)
+    window = (doc_days >= day - days_before) & (doc_days <= day + days_after)
+    if include_undated:
+        window |= doc_days == no_date
+    return window
+
+
+def portfolioResults(term_doc_matrix, doc_days, portfolio_dict, k=3, days_before=3, days_after=1,
+                     cooccur_index=None, n=4, include_undated=True):
+    # top k document ids of each day's movers among the articles in that day's date window
+    # every unique company is expanded (given a co-occurrence neighbour index) and scored in one
+    # matrix product, each day then only ranks its companies' rows over its window's columns
+    # gives {date: {company: [doc ids best first]}}
+    query_term_dict, day_companies = portfolioQueries(portfolio_dict)
+    if cooccur_index is not None:
+        query_term_dict = {name: list(set(terms + expandTermsFromIndex(cooccur_index, terms, n)))
+                           for name, terms in query_term_dict.items()}
+    companies = list(query_term_dict)
+    company_rows = {name: i for i, name in enumerate(companies)}
+    scores = np.nan_to_num(cosineScores(buildQueryMatrix(query_term_dict, term_doc_matrix), term_doc_matrix.matrix,
+                                        term_doc_matrix.doc_norms))
+
+    results = {}
+    for day, names in day_companies.items():
+        cols = np.flatnonzero(dateWindow(doc_days, day, days_before, days_after, include_undated))
+        rows = [company_rows[name] for name in names]
+        window_scores = scores[np.ix_(rows, cols)]
+        top = topKDocuments(window_scores, k) if len(rows) else []
+        results[day] = {name: [term_doc_matrix.doc_ids[cols[j]] for j in top[i] if window_scores[i, j] > 0]
+                        for i, name in enumerate(names)}
+    return results
@@ -0,0 +1,144 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import numpy as np
+from scipy import sparse
+from instrumentation import instruments
+
+
+def expansionVersion(term_cooccur):
+    # hash of the expansion source of global mode, a neighbour index or a co-occurrence matrix
+    # (sparse or dense, of the whole corpus or a local slice), None when there is none
+    if term_cooccur is None:
+        return None
+    digest = hashlib.sha1()
+    if isinstance(term_cooccur, dict):
+        digest.update(json.dumps(term_cooccur, sort_keys=True).encode('utf-8'))
+    elif sparse.issparse(term_cooccur):
+        term_cooccur = sparse.csr_matrix(term_cooccur)
+        digest.update(str(term_cooccur.shape).encode('utf-8'))
+        digest.update(np.asarray(term_cooccur.indptr, dtype=np.int64).tobytes())
+        digest.update(np.asarray(term_cooccur.indices, dtype=np.int64).tobytes())
+        digest.update(np.asarray(term_cooccur.data, dtype=np.float64).tobytes())
+    else:
+        term_cooccur = np.asarray(term_cooccur, dtype=np.float64)
+        digest.update(str(term_cooccur.shape).encode('utf-8'))
+        digest.update(np.ascontiguousarray(term_cooccur).tobytes())
+    return digest.hexdigest()
+
+
+class QueryCache:
+    # least recently used cache of per query score vectors over all documents
+    # keys are (index version, mode, n, expansion source version, sorted unique stemmed query
+    # terms) so the same query asked again, or a threshold sweep over the same scores, skips
+    # expansion and scoring, and nothing computed against an older index or a different
+    # co-occurrence source is ever handed back
+    # bounded by both the number of entries and the bytes of the score vectors, cached vectors
+    # are read only so a caller can't change what later hits get
+    def __init__(self, max_entries=4096, max_bytes=64 * 2 ** 20, filename=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.filename = filename
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        # last few expansion sources and their versions, so a source isn't hashed on every call
+        self.source_versions = OrderedDict()
+        if filename is not None:
+            self.load(filename)
+
+    @staticmethod
+    def key(index_version, mode, query_terms, n=None, source_version=None):
+        return index_version, mode, n, source_version, tuple(sorted(set(query_terms)))
+
+    def sourceVersion(self, term_cooccur, max_sources=2):
+        # expansionVersion of a source, remembered by identity, so treat a source as read only
+        # once it has been used with the cache
+        if term_cooccur is None:
+            return None
+        source = self.source_versions.get(id(term_cooccur))
+        if source is None or source[0] is not term_cooccur:
+            source = (term_cooccur, expansionVersion(term_cooccur))
+            self.source_versions[id(term_cooccur)] = source
+            if len(self.source_versions) > max_sources:
+                self.source_versions.popitem(last=False)
+        self.source_versions.move_to_end(id(term_cooccur))
+        return source[1]
+
+    def get(self, key):
+        scores = self.entries.get(key)
+        if scores is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return scores
+
+    def put(self, key, scores):
+        # gives the read only copy that was stored
+        scores = np.array(scores, dtype=np.float64)
+        scores.flags.writeable = False
+        if key in self.entries:
+            self.nbytes -= self.entries[key].nbytes
+        self.entries[key] = scores
+        self.entries.move_to_end(key)
+        self.nbytes += scores.nbytes
+        while self.entries and (len(self.entries) > self.max_entries or self.nbytes > self.max_bytes):
+            self.nbytes -= self.entries.popitem(last=False)[1].nbytes
+        return scores
+
+    def dropOtherVersions(self, index_version):
+        # forget everything computed against a different index
+        for key in [key for key in self.entries if key[0] != index_version]:
+            self.nbytes -= self.entries.pop(key).nbytes
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries), 'bytes': self.nbytes,
+                'hit_rate': self.hits / lookups if lookups else 0}
+
+    def save(self, filename=None):
+        # keys go in a json list, score vectors in a numpy archive under the same position
+        filename = filename or self.filename
+        keys = [[index_version, mode, n, source_version, list(terms)]
+                for index_version, mode, n, source_version, terms in self.entries]
+        arrays = {'scores_{}'.format(i): scores for i, scores in enumerate(self.entries.values())}
+        np.savez(filename, keys=np.array(json.dumps(keys)), **arrays)
+
+    def load(self, filename):
+        # read a cache written by save, does nothing if the file isn't there yet
+        # entries saved before keys held the expansion source version are skipped
+        if not os.path.exists(filename):
+            return
+        with np.load(filename) as archive:
+            keys = json.loads(str(archive['keys']))
+            for i, key in enumerate(keys):
+                if len(key) == 5:
+                    index_version, mode, n, source_version, terms = key
+                    self.put((index_version, mode, n, source_version, tuple(terms)),
+                             archive['scores_{}'.format(i)])
+
+
+def cachedScores(cache, index_version, mode, query_term_dict, n, score_misses, source_version=None):
+    # look every query up in the cache, score_misses({name: terms}) gives {name: score vector}
+    # for the ones that missed in a single batch, those are then added to the cache
+    # a query score_misses leaves out (no results) is cached as empty and left out again
+    # source_version is the expansionVersion of the co-occurrence source global mode expands with
+    results = {}
+    misses = {}
+    for name, query_terms in query_term_dict.items():
+        scores = cache.get(QueryCache.key(index_version, mode, query_terms, n, source_version))
+        if scores is None:
+            misses[name] = query_terms
+        else:
+            results[name] = scores
+    instruments.count('cache_hits', len(query_term_dict) - len(misses))
+    instruments.count('cache_misses', len(misses))
+    if misses:
+        scored = score_misses(misses)
+        for name, query_terms in misses.items():
+            key = QueryCache.key(index_version, mode, query_terms, n, source_version)
+            results[name] = cache.put(key, scored.get(name, []))
+    return {name: results[name] for name in query_term_dict if len(results[name])}
@@ -0,0 +1,192 @@
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import json
+import threading
+import time
+import numpy as np
+from text_analysis import analyzeText
+from term_doc_matrix import buildQueryMatrix
+from scoring import cosineScores, topKDocuments
+from cooccurrence import expandTermsFromIndex, loadCooccurIndex
+from binary_index import loadBinaryIndex
+from local_analysis import localExpandAndQuery
+from query_cache import QueryCache, cachedScores, expansionVersion
+
+
+class LatencyMetrics:
+    # request counts, errors and the latencies of the last max_samples requests of each endpoint
+    def __init__(self, max_samples=10000):
+        self.max_samples = max_samples
+        self.samples = {}
+        self.counts = {}
+        self.errors = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, seconds, error=False):
+        with self.lock:
+            self.samples.setdefault(endpoint, deque(maxlen=self.max_samples)).append(seconds)
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+            if error:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self):
+        # latencies in milliseconds over the kept samples
+        with self.lock:
+            endpoints = {}
+            for endpoint, samples in self.samples.items():
+                ms = np.array(samples) * 1000
+                endpoints[endpoint] = {'requests': self.counts[endpoint], 'errors': self.errors.get(endpoint, 0),
+                                       'mean_ms': float(ms.mean()), 'p50_ms': float(np.percentile(ms, 50)),
+                                       'p95_ms': float(np.percentile(ms, 95)), 'p99_ms': float(np.percentile(ms, 99)),
+                                       'max_ms': float(ms.max())}
+            return {'uptime_sec': time.time() - self.started, 'endpoints': endpoints}
+
+
+class QueryService:
+    # the index, document norms, co-occurrence neighbours and query cache kept in memory between
+    # requests, queries are given as text (analyzed the same way as the index) or as stemmed terms
+    # modes are the same as cachedQueryResults, 'plain', 'global' or 'local'
+    def __init__(self, index_dirname, cooccur_filename, query_terms_filename=None, cache_entries=4096):
+        self.index = loadBinaryIndex(index_dirname)
+        self.term_doc_matrix = self.index.matrix
+        # touch the norms so the first request doesn't pay for them
+        self.term_doc_matrix.doc_norms
+        self.cooccur_index = loadCooccurIndex(cooccur_filename)
+        self.cooccur_version = expansionVersion(self.cooccur_index)
+        self.query_terms = {}
+        if query_terms_filename is not None:
+            with open(query_terms_filename, 'r') as json_file:
+                self.query_terms = json.load(json_file)
+        self.cache = QueryCache(cache_entries)
+        self.metrics = LatencyMetrics()
+        # the cache and the lazily built parts of the matrix aren't thread safe
+        self.lock = threading.Lock()
+
+    def analyze(self, query):
+        # stemmed terms of a query given as a list of terms or as text
+        if isinstance(query, list) and all(isinstance(term, str) for term in query):
+            return list(query)
+        if isinstance(query, str):
+            return analyzeText(query)
+        raise ValueError('a query must be text or a list of terms, not {}'.format(json.dumps(query)))
+
+    def scoreMisses(self, mode, n):
+        def score(misses):
+            if mode == 'local':
+                return localExpandAndQuery(self.term_doc_matrix, misses, n)
+            if mode == 'global':
+                misses = {name: list(set(terms + expandTermsFromIndex(self.cooccur_index, terms, n)))
+                          for name, terms in misses.items()}
+            scores = cosineScores(buildQueryMatrix(misses, self.term_doc_matrix), self.term_doc_matrix.matrix,
+                                  self.term_doc_matrix.doc_norms)
+            return {name: scores[i] for i, name in enumerate(misses)}
+        return score
+
+    def search(self, queries, mode='global', n=4, k=3):
+        # {name: query} to {name: [{'doc_id', 'score'} of the k best documents]}, all queries are
+        # scored in one batch and queries without results get an empty list
+        if mode not in ('plain', 'global', 'local'):
+            raise ValueError('unknown mode {}'.format(mode))
+        if k < 1:
+            raise ValueError('k must be at least 1')
+        if n < 0:
+            raise ValueError('n must not be negative')
+        query_term_dict = {name: self.analyze(query) for name, query in queries.items()}
+        with self.lock:
+            results = cachedScores(self.cache, self.term_doc_matrix.version, mode, query_term_dict, n,
+                                   self.scoreMisses(mode, n), self.cooccur_version if mode == 'global' else None)
+        top_docs = {name: [] for name in queries}
+        for name, scores in results.items():
+            top = topKDocuments(scores, k)[0]
+            top_docs[name] = [{'doc_id': self.term_doc_matrix.doc_ids[i], 'score': float(scores[i])}
+                              for i in top if scores[i] > 0]
+        return top_docs
+
+    def portfolio(self, mode='global', n=4, k=3):
+        # top documents of every company in the query terms file
+        return self.search(self.query_terms, mode, n, k)
+
+    def health(self):
+        return {'status': 'ok', 'num_docs': len(self.term_doc_matrix), 'num_terms': self.term_doc_matrix.shape[1],
+                'index_version': self.term_doc_matrix.version, 'companies': len(self.query_terms)}
+
+    def stats(self):
+        return dict(self.metrics.summary(), cache=self.cache.stats())
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    # GET  /health, /metrics, /portfolio?mode=&n=&k=, /query?q=text&mode=&n=&k=
+    # POST /query {"query": text or [terms], "mode", "n", "k"}
+    #      /batch {"queries": {name: text or [terms]}, "mode", "n", "k"}
+    service = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self.respond(url.path, params)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            params = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            params = None
+        self.respond(urlparse(self.path).path, params)
+
+    def respond(self, path, params):
+        start = time.perf_counter()
+        status = 200
+        try:
+            if not isinstance(params, dict):
+                raise ValueError('request body must be a json object')
+            body = self.route(path, params)
+            if body is None:
+                status, body = 404, {'error': 'unknown endpoint {}'.format(path)}
+        except KeyError as error:
+            status, body = 400, {'error': 'missing {}'.format(error)}
+        except (ValueError, TypeError) as error:
+            status, body = 400, {'error': str(error)}
+        except Exception as error:
+            # anything else (e.g. missing nltk data) still gets an answer and counts as an error
+            status, body = 500, {'error': '{}: {}'.format(type(error).__name__, error)}
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        # unknown paths share one entry so the metrics can't grow without bound
+        if path != '/metrics':
+            self.service.metrics.record(path if status != 404 else 'unknown', time.perf_counter() - start,
+                                        status != 200)
+
+    def route(self, path, params):
+        mode = params.get('mode', 'global')
+        n = int(params.get('n', 4))
+        k = int(params.get('k', 3))
+        if path == '/health':
+            return self.service.health()
+        if path == '/metrics':
+            return self.service.stats()
+        if path == '/portfolio':
+            return self.service.portfolio(mode, n, k)
+        if path == '/query':
+            query = params['query'] if 'query' in params else params['q']
+            return self.service.search({'query': query}, mode, n, k)['query']
+        if path == '/batch':
+            if not isinstance(params['queries'], dict):
+                raise ValueError('queries must be a json object of name to query')
+            return self.service.search(params['queries'], mode, n, k)
+        return None
+
+    def log_message(self, format, *args):
+        # latencies are in /metrics, don't print a line per request
+        pass
+
+
+def makeServer(service, host='127.0.0.1', port=8080):
+    # threaded http server answering from the given QueryService, call serve_forever() on it
+    handler = type('BoundQueryHandler', (QueryHandler,), {'service': service})
+    return ThreadingHTTPServer((host, port), handler)
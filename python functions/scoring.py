@@ -0,0 +1,45 @@
+import numpy as np
+from scipy import sparse
+from instrumentation import instruments
+
+
+def documentNorms(doc_matrix):
+    # l2 norm of every document row, compute once and reuse for every query batch
+    doc_matrix = sparse.csr_matrix(doc_matrix)
+    return np.sqrt(np.asarray(doc_matrix.multiply(doc_matrix).sum(axis=1)).ravel())
+
+
+def cosineScores(query_matrix, doc_matrix, doc_norms=None):
+    # score all queries against all documents with one sparse matrix product
+    # returns a queries by documents array, nan where the query or document has no terms
+    query_matrix = sparse.csr_matrix(query_matrix)
+    doc_matrix = sparse.csr_matrix(doc_matrix)
+    if doc_norms is None:
+        doc_norms = documentNorms(doc_matrix)
+    query_norms = documentNorms(query_matrix)
+
+    instruments.count('queries_scored', query_matrix.shape[0])
+    instruments.count('docs_scored', query_matrix.shape[0] * doc_matrix.shape[0])
+    dots = (query_matrix @ doc_matrix.transpose()).toarray()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = dots / np.outer(query_norms, doc_norms)
+    return scores
+
+
+def topKDocuments(scores, k):
+    # get the row positions of the k best documents for each query, best first
+    # nan scores are never picked ahead of a real score
+    scores = np.nan_to_num(np.atleast_2d(scores), nan=-np.inf)
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return [np.array([], dtype=np.int64) for _ in range(len(scores))]
+    top = np.argpartition(scores, -k, axis=1)[:, -k:]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    return list(np.take_along_axis(top, order, axis=1))
+
+
+def thresholdDocuments(scores, threshold):
+    # get the row positions of documents scoring above the threshold for each query
+    scores = np.nan_to_num(np.atleast_2d(scores))
+    return [np.flatnonzero(row > threshold) for row in scores]
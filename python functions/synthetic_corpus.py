@@ -0,0 +1,62 @@
+import numpy as np
+
+# synthetic collection for scaling the retrieval benchmark past the 1400 Cranfield documents
+# documents are drawn from a zipf background vocabulary plus the words of one topic, every
+# query is made from the words of one topic and the documents of that topic are its relevant set
+
+
+def syntheticVocabulary(vocab_size, seed=0):
+    # pronounceable made up words, all alphabetic so they survive the text analysis
+    rng = np.random.default_rng(seed)
+    consonants = list('bcdfghjklmnprstvwz')
+    vowels = list('aeiou')
+    syllables = [c + v for c in consonants for v in vowels]
+    # dictionary keeps the words in the order drawn, the first ones become the most common
+    words = {}
+    while len(words) < vocab_size:
+        picks = rng.integers(len(syllables), size=(vocab_size, 4))
+        lengths = rng.integers(2, 5, size=vocab_size)
+        words.update(dict.fromkeys(''.join(syllables[i] for i in row[:length]) for row, length in zip(picks, lengths)))
+    return list(words)[:vocab_size]
+
+
+def topicWords(vocabulary, num_topics, words_per_topic=20, seed=0):
+    # each topic gets its own words from the less common end of the vocabulary
+    rng = np.random.default_rng(seed + 1)
+    rare = np.arange(len(vocabulary) // 10, len(vocabulary))
+    return [rng.choice(rare, words_per_topic, replace=False) for _ in range(num_topics)]
+
+
+def generateDocuments(num_docs, vocab_size=50000, doc_length=150, num_topics=225, topic_share=0.2,
+                      zipf=1.1, seed=0):
+    # generator of (doc number, text), documents are made one at a time so any size can be streamed
+    vocabulary = syntheticVocabulary(vocab_size, seed)
+    topics = topicWords(vocabulary, num_topics, seed=seed)
+    rng = np.random.default_rng(seed + 2)
+    ranks = np.arange(1, vocab_size + 1)
+    # cumulative zipf weights, searched with uniform draws instead of giving p to rng.choice
+    # which rebuilds the cumulative sum on every call
+    background = np.cumsum(ranks ** -zipf)
+    background /= background[-1]
+
+    for doc_num in range(num_docs):
+        topic = topics[doc_num % num_topics]
+        num_topic_words = rng.binomial(doc_length, topic_share)
+        word_ids = np.concatenate([np.searchsorted(background, rng.random(doc_length - num_topic_words)),
+                                   rng.choice(topic, num_topic_words)])
+        rng.shuffle(word_ids)
+        yield doc_num, ' '.join(vocabulary[i] for i in word_ids)
+
+
+def generateQueries(num_docs, vocab_size=50000, num_topics=225, query_length=8, seed=0):
+    # one query per topic, gives ({query number: text}, {query number: relevant doc numbers})
+    # query and doc numbers start at 1 like the Cranfield files
+    vocabulary = syntheticVocabulary(vocab_size, seed)
+    topics = topicWords(vocabulary, num_topics, seed=seed)
+    rng = np.random.default_rng(seed + 3)
+    queries = {}
+    query_rel = {}
+    for topic_num, topic in enumerate(topics):
+        queries[topic_num + 1] = ' '.join(vocabulary[i] for i in rng.choice(topic, query_length, replace=False))
+        query_rel[topic_num + 1] = list(range(topic_num + 1, num_docs + 1, num_topics))
+    return queries, query_rel
@@ -0,0 +1,101 @@
+import hashlib
+import numpy as np
+from scipy import sparse
+from scoring import documentNorms
+
+
+class TermDocMatrix:
+    # sparse document by term table, rows are documents and columns are terms
+    # keeps maps between row positions and document ids and column positions and terms
+    def __init__(self, matrix, terms, doc_ids, term_index=None):
+        self.matrix = sparse.csr_matrix(matrix)
+        self.terms = terms
+        self.doc_ids = doc_ids
+        # the vocabulary map can be shared between matrices built off the same corpus
+        if term_index is None:
+            term_index = {term: i for i, term in enumerate(terms)}
+        self.term_index = term_index
+        self.doc_index = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+        self._doc_norms = None
+        self._version = None
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    @property
+    def doc_norms(self):
+        # document l2 norms, computed the first time they are needed
+        if self._doc_norms is None:
+            self._doc_norms = documentNorms(self.matrix)
+        return self._doc_norms
+
+    @property
+    def version(self):
+        # hash of the matrix contents, vocabulary and document ids, changes whenever the index
+        # is rebuilt with different documents so anything cached against it can be dropped
+        if self._version is None:
+            digest = hashlib.sha1()
+            # fixed dtypes so a matrix read back from disk hashes the same as the one written
+            digest.update(np.asarray(self.matrix.indptr, dtype=np.int64).tobytes())
+            digest.update(np.asarray(self.matrix.indices, dtype=np.int64).tobytes())
+            digest.update(np.asarray(self.matrix.data, dtype=np.float64).tobytes())
+            digest.update('\n'.join(self.terms).encode('utf-8'))
+            digest.update('\n'.join(str(doc_id) for doc_id in self.doc_ids).encode('utf-8'))
+            self._version = digest.hexdigest()
+        return self._version
+
+    def rows(self, indices):
+        # get a new matrix of only the given document rows, vocabulary stays the same
+        indices = np.asarray(indices, dtype=np.int64)
+        return TermDocMatrix(self.matrix[indices], self.terms,
+                             [self.doc_ids[i] for i in indices], self.term_index)
+
+    def columns(self, terms):
+        # get the column positions of the terms that are in the vocabulary
+        return [self.term_index[term] for term in terms if term in self.term_index]
+
+
+def buildTermDocMatrix(document_tf_idf_dict, indices=None):
+    # build a sparse csr matrix straight from the tf*idf dictionary
+    # columns are given to terms in order of first appearance, same as the old dataframe columns
+    term_index = {}
+    terms = []
+    doc_ids = []
+    indptr = [0]
+    col_indices = []
+    values = []
+
+    for doc_id, doc_terms in document_tf_idf_dict.items():
+        doc_ids.append(doc_id)
+        for term, val in doc_terms.items():
+            if term not in term_index:
+                term_index[term] = len(terms)
+                terms.append(term)
+            col_indices.append(term_index[term])
+            values.append(val)
+        indptr.append(len(col_indices))
+
+    matrix = sparse.csr_matrix((np.array(values, dtype=np.float64),
+                                np.array(col_indices, dtype=np.int64),
+                                np.array(indptr, dtype=np.int64)),
+                               shape=(len(doc_ids), len(terms)))
+    term_doc_matrix = TermDocMatrix(matrix, terms, doc_ids, term_index)
+    if indices:
+        term_doc_matrix = term_doc_matrix.rows(indices)
+    return term_doc_matrix
+
+
+def buildQueryMatrix(query_term_dict, term_doc_matrix):
+    # build a sparse binary matrix of the queries, only terms in the vocabulary are kept
+    rows = []
+    cols = []
+    for i, query_terms in enumerate(query_term_dict.values()):
+        for col in set(term_doc_matrix.columns(query_terms)):
+            rows.append(i)
+            cols.append(col)
+    return sparse.csr_matrix((np.ones(len(rows)), (rows, cols)),
+                             shape=(len(query_term_dict), term_doc_matrix.shape[1]))
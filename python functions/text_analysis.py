@@ -0,0 +1,76 @@
+from collections import OrderedDict
+from nltk.stem import PorterStemmer
+from nltk.tokenize import word_tokenize
+from nltk.corpus import stopwords
+import json
+import os
+
+
+class StemCache:
+    # bounded memo of word -> Porter stem, the least recently used words are dropped first
+    def __init__(self, max_size=200000):
+        self.max_size = max_size
+        self.stems = OrderedDict()
+        self.ps = PorterStemmer()
+        self.hits = 0
+        self.misses = 0
+        # set to a dictionary to also collect newly stemmed words, workers send these back
+        self.learned = None
+
+    def stem(self, word):
+        stemmed_word = self.stems.get(word)
+        if stemmed_word is not None:
+            self.hits += 1
+            self.stems.move_to_end(word)
+            return stemmed_word
+        self.misses += 1
+        stemmed_word = self.ps.stem(word)
+        self.add(word, stemmed_word)
+        if self.learned is not None:
+            self.learned[word] = stemmed_word
+        return stemmed_word
+
+    def add(self, word, stemmed_word):
+        # put a stem in the cache without counting a lookup, used when merging worker caches
+        self.stems[word] = stemmed_word
+        self.stems.move_to_end(word)
+        if len(self.stems) > self.max_size:
+            self.stems.popitem(last=False)
+
+    def stats(self):
+        # lookup counts and hit rate since the cache was made
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.stems),
+                'hit_rate': self.hits / lookups if lookups else 0}
+
+    def save(self, filename):
+        # write the cached stems so the next run starts warm
+        with open(filename, 'w') as json_file:
+            json.dump(self.stems, json_file)
+
+    def load(self, filename):
+        # read stems written by save, does nothing if the file isn't there yet
+        if not os.path.exists(filename):
+            return
+        with open(filename, 'r') as json_file:
+            for word, stemmed_word in json.load(json_file).items():
+                self.add(word, stemmed_word)
+
+
+# stop words are read the first time text is analyzed, each process keeps its own stem cache
+stop_words = None
+stem_cache = StemCache()
+
+
+def analyzeText(text):
+    # tokenize, lowercase, drop stop words and non alphabetic tokens, then stem
+    # documents and queries both go through here so their terms always match
+    global stop_words
+    if stop_words is None:
+        stop_words = set(stopwords.words('english'))
+    stemmed_words = []
+    for word in word_tokenize(text):
+        word = word.lower()
+        if word not in stop_words and word.isalpha():
+            stemmed_words.append(stem_cache.stem(word))
+    return stemmed_words
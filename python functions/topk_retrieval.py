@@ -0,0 +1,97 @@
+import numpy as np
+from instrumentation import instruments
+
+
+class ImpactPostings:
+    # postings of every term with weights already divided by the document norm, so a
+    # document's cosine score is the sum of its weights over the query terms / query norm
+    # each term also keeps its largest weight, the most it can add to any document's score
+    def __init__(self, term_indptr, term_docs, term_weights, doc_norms, terms, term_index=None):
+        self.term_indptr = np.asarray(term_indptr)
+        self.term_docs = np.asarray(term_docs)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.term_weights = np.nan_to_num(np.asarray(term_weights) / np.asarray(doc_norms)[self.term_docs])
+        self.terms = terms
+        if term_index is None:
+            term_index = {term: i for i, term in enumerate(terms)}
+        self.term_index = term_index
+
+        self.upper_bounds = np.zeros(len(terms))
+        has_postings = np.diff(self.term_indptr) > 0
+        if self.term_weights.size:
+            self.upper_bounds[has_postings] = np.maximum.reduceat(
+                self.term_weights, self.term_indptr[:-1][has_postings])
+
+    def postings(self, term):
+        # document rows (ascending), normalized weights and upper bound of a term
+        col = self.term_index[term]
+        start, end = self.term_indptr[col], self.term_indptr[col + 1]
+        return self.term_docs[start:end], self.term_weights[start:end], self.upper_bounds[col]
+
+
+def buildImpactPostings(term_doc_matrix):
+    # impact postings from a TermDocMatrix, the columns of the tf*idf matrix are the postings
+    by_term = term_doc_matrix.matrix.tocsc()
+    by_term.sort_indices()
+    return ImpactPostings(by_term.indptr, by_term.indices, by_term.data, term_doc_matrix.doc_norms,
+                          term_doc_matrix.terms, term_doc_matrix.term_index)
+
+
+def impactPostingsFromBinaryIndex(binary_index):
+    # impact postings straight from the memory mapped postings arrays of a BinaryIndex
+    return ImpactPostings(binary_index.term_indptr, binary_index.term_docs, binary_index.term_weights,
+                          binary_index.doc_norms, binary_index.matrix.terms, binary_index.matrix.term_index)
+
+
+def maxScoreTopK(impact_postings, query_terms, k=3, stats=None):
+    # term at a time MaxScore over the postings of the query terms, gives the k best
+    # (document row, cosine score) pairs, best first
+    # terms are added from the largest upper bound down, once the upper bounds of the terms
+    # left can't lift a new document past the current kth best score, the rest of the terms
+    # only look up the documents already in the running instead of walking their postings
+    # pass a dictionary as stats to count the postings touched and the documents still in the
+    # running at the end
+    query_terms = [term for term in set(query_terms) if term in impact_postings.term_index]
+    if not query_terms or k <= 0:
+        return []
+    query_norm = np.sqrt(len(query_terms))
+
+    term_postings = sorted((impact_postings.postings(term) for term in query_terms),
+                           key=lambda postings: -postings[2])
+    # remaining[i] is the most the terms after term i can still add to a score
+    upper_bounds = np.array([postings[2] for postings in term_postings])
+    remaining = np.append(np.cumsum(upper_bounds[::-1])[::-1][1:], 0.0)
+
+    cand_docs = np.array([], dtype=np.int64)
+    cand_scores = np.array([], dtype=np.float64)
+    postings_touched = 0
+    pruning = False
+    for i, (docs, weights, _) in enumerate(term_postings):
+        if not pruning:
+            # new documents can still make the top k, merge in every posting of the term
+            all_docs, inverse = np.unique(np.concatenate([cand_docs, docs]), return_inverse=True)
+            cand_scores = np.bincount(inverse, weights=np.concatenate([cand_scores, weights]),
+                                      minlength=len(all_docs))
+            cand_docs = all_docs
+            postings_touched += len(docs)
+        elif len(docs) and len(cand_docs):
+            # only look up the candidates in this term's postings
+            pos = np.minimum(np.searchsorted(docs, cand_docs), len(docs) - 1)
+            found = docs[pos] == cand_docs
+            cand_scores[found] += weights[pos[found]]
+            postings_touched += int(found.sum())
+
+        if len(cand_docs) >= k:
+            threshold = np.partition(cand_scores, -k)[-k]
+            # a document not seen yet scores at most remaining[i], it has to beat the threshold
+            pruning = pruning or remaining[i] <= threshold
+            if pruning:
+                keep = cand_scores + remaining[i] >= threshold
+                cand_docs, cand_scores = cand_docs[keep], cand_scores[keep]
+
+    instruments.count('postings_touched', postings_touched)
+    if stats is not None:
+        stats['postings_touched'] = stats.get('postings_touched', 0) + postings_touched
+        stats['candidates'] = stats.get('candidates', 0) + len(cand_docs)
+    top = np.argsort(-cand_scores, kind='stable')[:k]
+    return [(int(cand_docs[j]), float(cand_scores[j] / query_norm)) for j in top if cand_scores[j] > 0]